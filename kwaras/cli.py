@@ -165,12 +165,15 @@ def convert_lexicon_cli(config_path: str = "lexicon.cfg", use_gui: bool = False)
         return 1
 
 
-def export_corpus_cli(config_path: Optional[str] = None, use_gui: bool = False) -> int:
+def export_corpus_cli(
+    config_path: Optional[str] = None, use_gui: bool = False, jobs: int = 1
+) -> int:
     """Export ELAN corpus to web interface. CLI version.
 
     Args:
         config_path: Path to corpus configuration file
         use_gui: (Unused, for API compatibility)
+        jobs: Number of processes cleaning EAFs in parallel
 
     Returns:
         0 on success, 1 on failure
@@ -198,7 +201,7 @@ def export_corpus_cli(config_path: Optional[str] = None, use_gui: bool = False)
         validate_config(cfg, ["FILE_DIR", "OLD_EAFS", "WWW"])
 
         logger.info(f"Exporting corpus from config: {config_path}")
-        web.main(cfg)
+        web.main(cfg, jobs=jobs)
         logger.info("Corpus export completed successfully")
         return 0
 
@@ -301,6 +304,13 @@ def parse_args() -> argparse.Namespace:
         default=None,
         help="Path to corpus configuration file (default: auto-detect from corpus.cfg)",
     )
+    exp_parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of EAFs to clean in parallel (default: 1)",
+    )
 
     # check-install command
     subparsers.add_parser(
@@ -337,7 +347,7 @@ def main() -> int:
     if args.command == "convert-lexicon":
         return convert_lexicon_cli(args.config)
     if args.command == "export-corpus":
-        return export_corpus_cli(args.config)
+        return export_corpus_cli(args.config, jobs=args.jobs)
     if args.command == "check-install":
         return check_install_cli()
 
@@ -370,7 +380,7 @@ def export_corpus_cmd() -> None:
     """Entry point for kwaras-export-corpus command."""
     args = parse_args()
     setup_logging(args.verbose)
-    sys.exit(export_corpus_cli(getattr(args, "config", None)))
+    sys.exit(export_corpus_cli(getattr(args, "config", None), jobs=getattr(args, "jobs", 1)))
 
 
 def check_install_cmd() -> None:
@@ -4,20 +4,321 @@
 """
 
 import csv
+import filecmp
+import gzip
+import hashlib
+import heapq
+import io
+import marshal
+import mmap
+import os
+import re
+import tempfile
 import xml.etree.ElementTree as etree
+import xml.parsers.expat as expat
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from contextlib import ExitStack, contextmanager, suppress
 from copy import deepcopy
+from itertools import accumulate, repeat
+from xml.sax.saxutils import escape
+
+# a whole TIER start tag, allowing ">" inside quoted attribute values
+_TIER_TAG = re.compile(rb"""<TIER(?=[\s/>])(?:[^>"']|"[^"]*"|'[^']*')*>""")
+_XML_DECL = re.compile(rb"(\xef\xbb\xbf)?(<\?xml[^>]*\?>)?")
+
+
+def _copy_value(note):
+    """Get the ANNOTATION_VALUE text of annotation @note"""
+    return note.find("ANNOTATION_VALUE").text
+
+
+_TEMPLATES = {}
+
+
+def _template_types(template):
+    """Get the LINGUISTIC_TYPE nodes of @template, parsing it only if it is new or changed"""
+    st = os.stat(template)
+    path = os.path.abspath(template)
+    stamp, ltnodes = _TEMPLATES.get(path, (None, None))
+    if stamp != (st.st_mtime_ns, st.st_size):
+        ltnodes = etree.parse(template).getroot().findall("LINGUISTIC_TYPE")
+        _TEMPLATES[path] = ((st.st_mtime_ns, st.st_size), ltnodes)
+    return ltnodes
+
+
+def type_digest(template):
+    """Get a hex digest of the LINGUISTIC_TYPEs of @template, which is all that
+    Eaf.import_types takes from it
+    """
+    digest = hashlib.sha1()
+    for lt in _template_types(template):
+        digest.update(repr(sorted(lt.attrib.items())).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _chunks(size, chunk_size):
+    """Split @size bytes into blocks of at most @chunk_size"""
+    while size > 0:
+        yield min(size, chunk_size)
+        size -= chunk_size
+
+
+class _TierSpans:
+    """Interval index over the annotations of one tier, sorted by start time"""
+
+    def __init__(self, notes):
+        """@notes: list of ((start, stop), annotation) in document order"""
+        rows = sorted((t[0], t[1], n, a) for n, (t, a) in enumerate(notes))
+        self.starts = [r[0] for r in rows]
+        self.stops = [r[1] for r in rows]
+        self.order = [r[2] for r in rows]
+        self.nodes = [r[3] for r in rows]
+        # latest stop time among the first i+1 annotations, to bound backward scans
+        self.reach = list(accumulate(self.stops, max))
+
+    def within(self, start, stop):
+        """Get the annotations lying between @start and @stop, in document order"""
+        lo = bisect_left(self.starts, start)
+        hi = bisect_right(self.starts, stop)
+        found = [i for i in range(lo, hi) if self.stops[i] <= stop]
+        found.sort(key=self.order.__getitem__)
+        return [self.nodes[i] for i in found]
+
+    def at(self, time):
+        """Get the first annotation (in document order) containing or starting at @time"""
+        best = None
+        i = bisect_right(self.starts, time) - 1
+        while i >= 0 and self.reach[i] > time:
+            if self.stops[i] > time and (best is None or self.order[i] < self.order[best]):
+                best = i
+            i -= 1
+        if best is not None:
+            return self.nodes[best]
 
 
 class Eaf:
-    def __init__(self, filename):
+    def __init__(self, filename, patchable=False, lazy=False):
+        """@patchable: record where each ANNOTATION_VALUE lies in the file, so that value edits
+        can be saved with write(..., patch=True)
+        @lazy: parse the annotations of each tier only when the tier is first looked up
+        """
 
         if not filename.endswith(".eaf"):
             raise Exception("Not an EAF:" + filename)
+        if patchable and lazy:
+            raise ValueError("An Eaf cannot be both patchable and lazy")
         self.filename = filename
-        self.eafile = etree.parse(filename).getroot()
+        self._values = None
+        self._unparsed = {}
+        self._declaration = b""
+        if lazy:
+            self.eafile = self._parse_skeleton(filename)
+        elif patchable:
+            self.eafile = self._parse_tracking_values(filename)
+            self._layout_digest = self._layout()
+        else:
+            self.eafile = etree.parse(filename).getroot()
+        self._batch_depth = 0
+        self._init_types()
+        self._init_tiers()
         self._init_times()
 
+    def _parse_tracking_values(self, filename):
+        """Parse @filename as etree.parse does, also recording the byte span of the text of each
+        ANNOTATION_VALUE as [element, start, end, original text, self-closing]
+        """
+        builder = etree.TreeBuilder()
+        parser = expat.ParserCreate(namespace_separator="}")
+        parser.ordered_attributes = True
+        self._values = []
+        current = None
+
+        def fixname(name):
+            return "{" + name if "}" in name else name
+
+        def start(tag, attrs):
+            nonlocal current
+            attrib = {fixname(k): v for k, v in zip(attrs[0::2], attrs[1::2])}
+            elem = builder.start(fixname(tag), attrib)
+            if tag == "ANNOTATION_VALUE":
+                context = parser.GetInputContext()
+                tag_end = parser.CurrentByteIndex + context.index(b">") + 1
+                if context[: context.index(b">")].endswith(b"/"):
+                    # <ANNOTATION_VALUE/>: the span is the whole tag
+                    current = [elem, parser.CurrentByteIndex, tag_end, None, True]
+                else:
+                    current = [elem, tag_end, None, None, False]
+                self._values.append(current)
+
+        def end(tag):
+            nonlocal current
+            elem = builder.end(fixname(tag))
+            if tag == "ANNOTATION_VALUE":
+                if not current[4]:
+                    current[2] = parser.CurrentByteIndex
+                current[3] = elem.text
+                current = None
+
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = builder.data
+        with open(filename, "rb") as stream:
+            parser.ParseFile(stream)
+        return builder.close()
+
+    def _parse_skeleton(self, filename):
+        """Parse @filename with every TIER left empty, recording the byte range of each one's
+        contents in _unparsed for _materialize
+
+        Falls back to a full parse wherever the byte scan cannot be trusted to find the tiers.
+        """
+        parts = []
+        bodies = []
+        with open(filename, "rb") as stream:
+            mm = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        with mm:
+            decl = _XML_DECL.match(mm)
+            # tier contents are parsed with the declaration, so they get the file's encoding
+            self._declaration = decl.group(2) or b""
+            if mm.find(b"<!", decl.end()) != -1 or mm.find(b"<?", decl.end()) != -1:
+                # comments, CDATA sections and the like can hide or fake tier tags
+                return etree.parse(filename).getroot()
+            pos = 0
+            for match in _TIER_TAG.finditer(mm, decl.end()):
+                tag_end = match.end()
+                if mm[tag_end - 2 : tag_end - 1] == b"/":
+                    parts.append(mm[pos:tag_end])
+                    bodies.append((tag_end, tag_end))
+                    pos = tag_end
+                else:
+                    close = mm.find(b"</TIER>", tag_end)
+                    if close == -1:
+                        return etree.parse(filename).getroot()
+                    parts.append(mm[pos : tag_end - 1] + b"/>")
+                    bodies.append((tag_end, close))
+                    pos = close + len(b"</TIER>")
+            parts.append(mm[pos:])
+        try:
+            root = etree.fromstring(b"".join(parts))
+        except etree.ParseError:
+            return etree.parse(filename).getroot()
+        tiers = root.findall("TIER")
+        if len(tiers) != len(bodies):
+            # some "<TIER" was not a tier tag, so the ranges cannot be trusted
+            return etree.parse(filename).getroot()
+        self._skeleton = {t: n for n, t in enumerate(tiers)}
+        self._unparsed = {t: span for t, span in zip(tiers, bodies) if span[0] < span[1]}
+        return root
+
+    def _materialize(self, tiers=None):
+        """Parse and index the annotations of @tiers, and of the tiers they depend on,
+        if they are still unparsed
+        @tiers: TIER nodes (default parses all the remaining tiers)
+        """
+        if not self._unparsed:
+            return
+        if tiers is None:
+            tiers = list(self._unparsed)
+        todo = []
+        stack = list(tiers)
+        while stack:
+            tier = stack.pop()
+            if tier in self._unparsed and tier not in todo:
+                todo.append(tier)
+                stack.extend(self._tiers.get(tier.get("PARENT_REF"), []))
+        if not todo:
+            return
+        todo.sort(key=lambda t: self._unparsed[t])
+        bodies = []
+        try:
+            with open(self.filename, "rb") as stream:
+                for tier in todo:
+                    start, stop = self._unparsed[tier]
+                    stream.seek(start)
+                    body = self._declaration + b"<TIER>" + stream.read(stop - start) + b"</TIER>"
+                    bodies.append(etree.fromstring(body))
+        except etree.ParseError:
+            # a tier does not parse on its own (e.g. it uses a namespace declared on the
+            # document), so take all the remaining tiers from a full parse
+            todo = sorted(self._unparsed, key=self._unparsed.get)
+            full = etree.parse(self.filename).getroot().findall("TIER")
+            bodies = [full[self._skeleton[t]] for t in todo]
+        for tier, body in zip(todo, bodies):
+            del self._unparsed[tier]
+            tier.text = body.text
+            tier.extend(body)
+        self._index_tiers(todo)
+
+    def _layout(self):
+        """Get a digest of everything in the document except the ANNOTATION_VALUE texts"""
+        digest = hashlib.sha1()
+        for elem in self.eafile.iter():
+            text = None if elem.tag == "ANNOTATION_VALUE" else elem.text
+            digest.update(repr((elem.tag, sorted(elem.attrib.items()), text)).encode("utf-8"))
+        return digest.digest()
+
+    def _write_patched(self, outstr, buffer_size=2**20):
+        """Write the source file to @outstr, replacing only the ANNOTATION_VALUEs that changed"""
+        with open(self.filename, "rb") as src:
+            pos = 0
+            for elem, start, end, text, closed in self._values:
+                if elem.text == text:
+                    continue
+                for remaining in _chunks(start - pos, buffer_size):
+                    outstr.write(src.read(remaining))
+                value = escape(elem.text or "").encode("utf-8")
+                if closed:
+                    value = b"<ANNOTATION_VALUE>" + value + b"</ANNOTATION_VALUE>"
+                outstr.write(value)
+                src.seek(end)
+                pos = end
+            for block in iter(lambda: src.read(buffer_size), b""):
+                outstr.write(block)
+
+    def _init_tiers(self):
+        """Index the TIER nodes by TIER_ID, keeping their document order"""
+        self._tier_order = self.eafile.findall("TIER")
+        self._tiers = {}
+        self._dependents = {}
+        for t in self._tier_order:
+            self._tiers.setdefault(t.get("TIER_ID"), []).append(t)
+            self._add_dependent_tier(t)
+
+    def _init_types(self):
+        """Index the LINGUISTIC_TYPE nodes by LINGUISTIC_TYPE_ID, keeping their document order,
+        and their ids by (independent, time_alignable) for get_valid_types
+        """
+        self._types = {}
+        for lt in self.eafile.findall("LINGUISTIC_TYPE"):
+            self._types.setdefault(lt.get("LINGUISTIC_TYPE_ID"), lt)
+        self._valid_types = {}
+        for independent in (None, True, False):
+            for time_alignable in (None, True, False):
+                self._valid_types[independent, time_alignable] = [
+                    tid
+                    for tid, lt in self._types.items()
+                    if independent is None or (lt.get("CONSTRAINTS") is None) == independent
+                    if time_alignable is None
+                    or lt.get("TIME_ALIGNABLE") == str(time_alignable).lower()
+                ]
+
+    def _add_dependent_tier(self, tier):
+        """Index TIER @tier under the TIER_ID of its parent"""
+        if tier.get("PARENT_REF"):
+            self._dependents.setdefault(tier.get("PARENT_REF"), []).append(tier)
+
+    def _remove_dependent_tier(self, tier):
+        """Drop TIER @tier from the index of dependent tiers"""
+        deps = self._dependents.get(tier.get("PARENT_REF"), [])
+        if tier in deps:
+            deps.remove(tier)
+            if not deps:
+                del self._dependents[tier.get("PARENT_REF")]
+
     def _init_times(self):
+        self._spans = {}
         timenodes = self.eafile.findall("TIME_ORDER/TIME_SLOT")
         stimes = {}
         prev = 0
@@ -26,86 +327,170 @@ class Eaf:
             stimes[tn.get("TIME_SLOT_ID")] = now
             prev = now
 
-        aanodes = self.eafile.findall(".//ALIGNABLE_ANNOTATION")
-        self.times = {}
-        for aa in aanodes:
-            self.times[aa.get("ANNOTATION_ID")] = [
-                stimes[aa.get("TIME_SLOT_REF1")],
-                stimes[aa.get("TIME_SLOT_REF2")],
-            ]
-        self.times["ALL"] = (0, prev)
-
-        ranodes = self.eafile.findall(".//REF_ANNOTATION")
-        links = {}
-        for ra in ranodes:
-            links[ra.get("ANNOTATION_ID")] = ra.get("ANNOTATION_REF")
+        self.times = {"ALL": (0, prev)}
+        self._slots = stimes
+        self._annotations = {}
+        self._children = {}
+        self._links = {}
+        self._pending = []
+        self._index_tiers(self._tier_order)
+
+    def _index_tiers(self, tiers):
+        """Add the annotations on @tiers to the time, id and dependent indexes"""
+        ranodes = []
+        for tier in tiers:
+            for note in tier.iter():
+                if note.tag == "ALIGNABLE_ANNOTATION":
+                    self.times[note.get("ANNOTATION_ID")] = [
+                        self._slots[note.get("TIME_SLOT_REF1")],
+                        self._slots[note.get("TIME_SLOT_REF2")],
+                    ]
+                elif note.tag == "REF_ANNOTATION":
+                    ranodes.append(note)
+                    self._links[note.get("ANNOTATION_ID")] = note.get("ANNOTATION_REF")
+                    self._add_child(tier, note)
+                else:
+                    continue
+                self._annotations[note.get("ANNOTATION_ID")] = (note, tier)
+
+        # follow each chain of ANNOTATION_REFs up to its first timed ancestor only once,
+        # and give every annotation along the way that ancestor's times
         for ra in ranodes:
-            ra_id = ref = ra.get("ANNOTATION_ID")
-            times = None
-            for _iter in range(5):
-                ref = links.get(ref)
-                if ref:
-                    times = self.times.get(ref)
-                    if times is not None:
-                        break
-            self.times[ra_id] = times
+            ref = ra.get("ANNOTATION_ID")
+            chain = []
+            seen = set()
+            while ref in self._links and ref not in self.times and ref not in seen:
+                chain.append(ref)
+                seen.add(ref)
+                ref = self._links[ref]
+            times = None if ref in seen else self.times.get(ref)
+            for ra_id in chain:
+                self.times[ra_id] = times
+
+    def _flush(self):
+        """Index the annotations of tiers inserted since the last lookup"""
+        if self._pending:
+            tiers, self._pending = self._pending, []
+            self._index_tiers(tiers)
+
+    @contextmanager
+    def batch(self):
+        """Group several edits, indexing the annotations of inserted tiers only once
+
+        Within the block, inserted tiers are indexed at the next annotation lookup
+        or when the block exits, whichever comes first.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._flush()
 
     def get_annotation(self, aref):
         """Get the annotation with the given ANNOTATION_ID"""
-        anode = self.eafile.find(f"[@ANNOTATION_ID='{aref}']")
+        self._flush()
+        if aref not in self._annotations:
+            self._materialize()
+        anode, _tier = self._annotations.get(aref, (None, None))
         return anode
 
+    def get_tier_of(self, aref):
+        """Get the TIER containing the annotation with the given ANNOTATION_ID"""
+        self._flush()
+        if aref not in self._annotations:
+            self._materialize()
+        _anode, tier = self._annotations.get(aref, (None, None))
+        return tier
+
+    def _add_child(self, tier, ra):
+        """Index REF_ANNOTATION @ra on @tier under the annotation it refers to"""
+        bytier = self._children.setdefault(ra.get("ANNOTATION_REF"), {})
+        bytier.setdefault(tier, []).append(ra)
+
+    def _remove_child(self, tier, ra):
+        """Drop REF_ANNOTATION @ra on @tier from the index of dependents"""
+        bytier = self._children.get(ra.get("ANNOTATION_REF"), {})
+        if ra in bytier.get(tier, []):
+            bytier[tier].remove(ra)
+            if not bytier[tier]:
+                del bytier[tier]
+
     def get_annotation_on(self, tid, node):
         """Get the annotation on tier @tid directly dependent on annotation @node"""
-        aref = node.get("ANNOTATION_ID")
-        tier = self.get_tier_by_id(tid)
-        ranodes = tier.findall(".//REF_ANNOTATION")
-        for ra in ranodes:
-            if ra.get("ANNOTATION_REF") == aref:
-                return ra
+        deps = self.get_children(node, tid)
+        if deps:
+            return deps[0]
+
+    def get_children(self, annotation, tier=None):
+        """Get the REF_ANNOTATIONs directly dependent on @annotation, in document order
+        @tier: TIER_ID to restrict the dependents to (default looks on all tiers)
+        """
+        self._flush()
+        if tier is not None:
+            tier = self.get_tier_by_id(tier)
+        else:
+            self._materialize()
+        bytier = self._children.get(annotation.get("ANNOTATION_ID"), {})
+        if tier is not None:
+            return list(bytier.get(tier, []))
+        return [ra for t in self._tier_order for ra in bytier.get(t, [])]
+
+    def _get_spans(self, tier):
+        """Get the interval index of @tier, building it on first use"""
+        self._flush()
+        self._materialize([tier])
+        spans = self._spans.get(tier)
+        if spans is None:
+            aanodes = tier.findall(".//ALIGNABLE_ANNOTATION")
+            if aanodes:
+                notes = [(self.times[aa.get("ANNOTATION_ID")], aa) for aa in aanodes]
+            else:
+                ranodes = tier.findall(".//REF_ANNOTATION")
+                notes = [(self.times[ra.get("ANNOTATION_REF")], ra) for ra in ranodes]
+            spans = self._spans[tier] = _TierSpans(notes)
+        return spans
 
     def get_annotation_at(self, tid, time):
         """Get the annotation on tier @tid containing or starting at @time"""
-        tier = self.get_tier_by_id(tid)
-        aanodes = tier.findall(".//ALIGNABLE_ANNOTATION")
-        if aanodes:
-            for aa in aanodes:
-                (start, stop) = self.times[aa.get("ANNOTATION_ID")]
-                if start <= time < stop:
-                    return aa
-        else:
-            ranodes = tier.findall(".//REF_ANNOTATION")
-            for ra in ranodes:
-                (start, stop) = self.times[ra.get("ANNOTATION_REF")]
-                if start <= time < stop:
-                    return ra
+        return self._get_spans(self.get_tier_by_id(tid)).at(time)
 
     def get_annotations_in(self, tid, start=0, stop=None):
         """Get a list of the annotations on tier @tid between @start and @stop, defaulting to all"""
         if stop is None:
             stop = self.times["ALL"][1]
-        annots = []
-        if tid in self.get_tier_ids():
-            tier = self.get_tier_by_id(tid)
-            aanodes = tier.findall(".//ALIGNABLE_ANNOTATION")
-            if aanodes:
-                # print "aanodes", len(aanodes)
-                for aa in aanodes:
-                    (ti, tf) = self.times[aa.get("ANNOTATION_ID")]
-                    if start <= ti and tf <= stop:
-                        annots.append(aa)
-            else:
-                ranodes = tier.findall(".//REF_ANNOTATION")
-                # print "ranodes", len(ranodes)
-                for ra in ranodes:
-                    (ti, tf) = self.times[ra.get("ANNOTATION_REF")]
-                    # print len(annots), [start, ti, tf, stop]
-                    if (start <= ti) and (tf <= stop):
-                        annots.append(ra)
-        return annots
+        if tid not in self._tiers:
+            return []
+        return self._get_spans(self.get_tier_by_id(tid)).within(start, stop)
+
+    def iter_aligned(self, tiers):
+        """Generate (start, end, values) for each time segment annotated on any of @tiers,
+        in time order, merging the tiers as it goes
+        @tiers: list of TIER_IDs
+
+        values lists the stripped ANNOTATION_VALUE on each of @tiers with exactly those times,
+        or None where there is none. Where a tier has several, the last one in document order
+        is taken, as parse_export_file does.
+        """
+        streams = []
+        for idx, tid in enumerate(tiers):
+            if tid in self._tiers:
+                spans = self._get_spans(self.get_tier_by_id(tid))
+                rows = zip(spans.starts, spans.stops, repeat(idx), spans.order, spans.nodes)
+                streams.append(rows)
+        return _merge_aligned(streams, len(tiers), _stripped_value)
+
+    def export_segments(self, fields):
+        """Generate (start, end, speaker, values) for each time segment annotated on the tiers
+        of @fields, where values has the annotations of each field joined across speakers
+        @fields: list of fields to export
+        """
+        return self.columns(_select_tiers(self.get_tier_ids(), fields)).export_segments(fields)
 
     def get_time(self, annot):
         """Get the (start, stop) times of the annotation @annot"""
+        self._flush()
         if annot.tag == "ALIGNABLE_ANNOTATION":
             ai = annot.get("ANNOTATION_ID")
             if ai not in self.times:
@@ -123,33 +508,30 @@ class Eaf:
         # need to create annotations for blank tiers
 
     def get_tier_ids(self):
-        tiers = self.eafile.findall("TIER")
-        ids = [t.get("TIER_ID") for t in tiers]
-        return ids
+        return [t.get("TIER_ID") for t in self._tier_order]
 
     def get_tier_by_id(self, tid):
-        tiers = self.eafile.findall("TIER")
-        matchlist = [t for t in tiers if t.get("TIER_ID") == tid]
+        matchlist = self._tiers.get(tid, [])
+        self._materialize(matchlist)
         if len(matchlist) == 1:
             targ = matchlist[0]
         elif len(matchlist) > 1:
-            tierids = [t.get("TIER_ID") for t in tiers]
+            tierids = self.get_tier_ids()
             sizes = [len(list(t)) for t in matchlist]
             targ = matchlist[sizes.index(max(sizes))]  # the largest tier
             print(
                 f"WARNING: TIER_ID {tid} matched {len(matchlist)} nodes with lengths {sizes}.\n{tierids}",
             )
         else:
-            tierids = [t.get("TIER_ID") for t in tiers]
+            tierids = self.get_tier_ids()
             raise NameError(f"TIER_ID {tid} matched {len(matchlist)} nodes.\n{tierids}")
         return targ
 
     def insert_tier(self, tier, after=None):
 
         # make sure tid is not a duplicate
-        tierids = self.get_tier_ids()
         tid = tier.get("TIER_ID")
-        if tid in tierids:
+        if tid in self._tiers:
             raise NameError(f"TIER_ID {tid} already used.")
 
         # renumber the annotation ids appropriately
@@ -161,25 +543,27 @@ class Eaf:
         nextIdInt = int(lastIdElem.text) + 1
 
         annotes = list(tier.iter("ALIGNABLE_ANNOTATION")) + list(tier.iter("REF_ANNOTATION"))
-        endIdInt = nextIdInt + len(annotes)
-
-        for idx in range(nextIdInt, endIdInt):
-            note = annotes.pop(0)
+        for idx, note in enumerate(annotes, nextIdInt):
             note.set("ANNOTATION_ID", "a" + str(idx))
-        lastIdElem.text = str(endIdInt - 1)
+        lastIdElem.text = str(nextIdInt + len(annotes) - 1)
 
         # put it in the tree
         if after:  # not None and not blank
             at_idx = [k.get("TIER_ID", "") for k in self.eafile].index(after)
+            self._tier_order.insert(self.get_tier_ids().index(after), tier)
         else:
             # last tier
-            at_idx = len(list(self.eafile.iter())) - list(
-                reversed([k.tag for k in self.eafile.iter()])
-            ).index("TIER")
+            at_idx = list(self.eafile).index(self._tier_order[-1]) + 1
+            self._tier_order.append(tier)
 
         self.eafile.insert(at_idx, tier)
+        self._tiers[tid] = [tier]
+        self._add_dependent_tier(tier)
 
-        self._init_times()
+        # only the new tier's annotations need indexing
+        self._pending.append(tier)
+        if not self._batch_depth:
+            self._flush()
 
     def copy_tier(self, src_id, targ_id, parent=None, ltype=None):
 
@@ -201,23 +585,123 @@ class Eaf:
 
         return targ
 
+    def derive_tier(self, src_id, new_id, transform=None, ltype=None, parent=None, after=None):
+        """Insert a dependent tier with one annotation for each annotation on tier @src_id
+        @transform: function from a source annotation to the value of its counterpart
+        (default copies the value)
+        @ltype: LINGUISTIC_TYPE_REF of the new tier (default is that of @src_id)
+        @parent: TIER_ID of the new tier's parent (default is @src_id)
+        @after: TIER_ID to insert the new tier at, as for insert_tier
+
+        A symbolic tier is built in one pass over the source annotations; a time-alignable
+        one is made by copy_tier, keeping the source's time slots.
+
+        Returns the new TIER node.
+        """
+        srctier = self.get_tier_by_id(src_id)
+        if parent is None:
+            parent = src_id
+        if ltype is None:
+            ltype = srctier.get("LINGUISTIC_TYPE_REF")
+        if ltype not in self.get_valid_types(independent=False):
+            raise RuntimeWarning("Type " + ltype + " is not recognized as a valid tier type.")
+        if ltype in self.get_valid_types(independent=False, time_alignable=True):
+            targ = self.copy_tier(src_id, new_id, parent, ltype)
+            if transform is not None:
+                for src_ann, ann in zip(srctier.findall("ANNOTATION"), targ.findall("ANNOTATION")):
+                    ann[0].find("ANNOTATION_VALUE").text = transform(src_ann[0])
+            self.insert_tier(targ, after)
+            return targ
+        if transform is None:
+            transform = _copy_value
+        # annotations after the first under the same parent continue a subdivision
+        subdivision = self._types[ltype].get("CONSTRAINTS") == "Symbolic_Subdivision"
+        last = {}  # parent ANNOTATION_ID -> last REF_ANNOTATION under it
+        follows = []  # (REF_ANNOTATION, the one before it)
+
+        targ = etree.Element("TIER", srctier.attrib)
+        targ.set("TIER_ID", new_id)
+        targ.set("PARENT_REF", parent)
+        targ.set("LINGUISTIC_TYPE_REF", ltype)
+        targ.text, targ.tail = srctier.text, srctier.tail
+
+        # reuse the source's whitespace, so the new tier is laid out like the rest of the file
+        for src_ann in srctier.findall("ANNOTATION"):
+            note = src_ann[0]
+            src_value = note.find("ANNOTATION_VALUE")
+            if parent == src_id:
+                aref = note.get("ANNOTATION_ID")
+            elif note.tag == "REF_ANNOTATION" and srctier.get("PARENT_REF") == parent:
+                aref = note.get("ANNOTATION_REF")
+            else:
+                aref = self.get_annotation_at(parent, self.get_time(note)[0]).get("ANNOTATION_ID")
+
+            ann = etree.SubElement(targ, "ANNOTATION")
+            ann.text, ann.tail = src_ann.text, src_ann.tail
+            # ANNOTATION_IDs are allocated by insert_tier
+            ref = etree.SubElement(ann, "REF_ANNOTATION", ANNOTATION_ID="", ANNOTATION_REF=aref)
+            ref.text, ref.tail = note.text, note.tail
+            value = etree.SubElement(ref, "ANNOTATION_VALUE")
+            value.text, value.tail = transform(note), src_value.tail
+            if subdivision and aref in last:
+                follows.append((ref, last[aref]))
+            last[aref] = ref
+
+        self.insert_tier(targ, after)
+        for ref, previous in follows:
+            ref.set("PREVIOUS_ANNOTATION", previous.get("ANNOTATION_ID"))
+        return targ
+
     def rename_tier(self, tier, new_id):
 
         old_id = tier.get("TIER_ID")
         tier.set("TIER_ID", new_id)
-        deptiers = [t for t in self.eafile.iter("TIER") if t.get("PARENT_REF") == old_id]
+
+        # keep the tier index in step, if the tier is already in the document
+        matchlist = self._tiers.get(old_id, [])
+        if tier in matchlist:
+            matchlist.remove(tier)
+            if not matchlist:
+                del self._tiers[old_id]
+            self._tiers.setdefault(new_id, []).append(tier)
+
+        deptiers = self._dependents.pop(old_id, [])
         for dep in deptiers:
             dep.set("PARENT_REF", new_id)
+        if deptiers:
+            self._dependents.setdefault(new_id, []).extend(deptiers)
+
+    def get_dependent_tiers(self, tid, recursive=False):
+        """Get the TIER_IDs of the tiers whose parent is tier @tid
+        @recursive: also get the tiers depending on those, and so on, depth first
+        """
+        found = []
+        seen = {tid}
+        stack = list(reversed(self._dependents.get(tid, [])))
+        while stack:
+            dep_id = stack.pop().get("TIER_ID")
+            if dep_id in seen:
+                continue
+            seen.add(dep_id)
+            found.append(dep_id)
+            if recursive:
+                stack.extend(reversed(self._dependents.get(dep_id, [])))
+        return found
 
     def change_parent(self, tier, new_ref, ltype=None):
         """Changes the parent and/or type of a tier.
         @warning: changing the parentage or type can create an invalid eaf
         @todo: check that the parent and type are compatible
         """
+        indexed = tier in self._tiers.get(tier.get("TIER_ID"), [])
+        if indexed:
+            self._remove_dependent_tier(tier)
         if new_ref:
             tier.set("PARENT_REF", new_ref)
         elif "PARENT_REF" in tier.attrib:
             del tier.attrib["PARENT_REF"]
+        if indexed:
+            self._add_dependent_tier(tier)
         if ltype is not None:
             if ltype not in self.get_valid_types():
                 raise RuntimeWarning(
@@ -231,14 +715,20 @@ class Eaf:
 
     def rectify_type(self, tier):
         """Ensure that the parentage, atype and time refs are appropriate to the tier's ltype"""
+        self._spans.pop(tier, None)
+        # dependents are indexed only for tiers in the document, and pending ones are
+        # indexed as they stand once they are flushed
+        indexed = tier in self._tiers.get(tier.get("TIER_ID"), []) and tier not in self._pending
         parent = tier.get("PARENT_REF")
         ltype = tier.get("LINGUISTIC_TYPE_REF")
-        ltype_node = self.eafile.find(f"LINGUISTIC_TYPE[@LINGUISTIC_TYPE_ID='{ltype}']")
+        ltype_node = self._types.get(ltype)
         if ltype_node.get("TIME_ALIGNABLE") == "true":
             refnotes = tier.findall("ANNOTATION/REF_ANNOTATION")
             if len(refnotes) > 0:
                 print("REF_ANNOTATION in time-alignable tier", tier.get("TIER_ID"))
                 for note in refnotes:
+                    if indexed:
+                        self._remove_child(tier, note)
                     tref = self.get_time(note)
                     note.set("TIME_SLOT_REF1", tref[0])
                     note.set("TIME_SLOT_REF2", tref[1])
@@ -255,110 +745,645 @@ class Eaf:
                     del note.attrib["TIME_SLOT_REF1"]
                     del note.attrib["TIME_SLOT_REF2"]
                     note.tag = "REF_ANNOTATION"
+                    if indexed:
+                        self._add_child(tier, note)
 
     def get_valid_types(self, independent=None, time_alignable=None):
-
-        types = self.eafile.findall("LINGUISTIC_TYPE")
-
-        if independent is True:
-            types = [lt for lt in types if lt.get("CONSTRAINTS") is None]
-        elif independent is False:
-            types = [lt for lt in types if lt.get("CONSTRAINTS") is not None]
-
-        if time_alignable is None:
-            types = [lt for lt in types]
-        else:
-            tas = str(time_alignable).lower()
-            types = [lt for lt in types if lt.get("TIME_ALIGNABLE") == tas]
-
-        typeids = [lt.get("LINGUISTIC_TYPE_ID") for lt in types]
-        return typeids
+        """Get the LINGUISTIC_TYPE_IDs, in document order
+        @independent: if True, only types without CONSTRAINTS; if False, only those with them
+        @time_alignable: if not None, only types whose TIME_ALIGNABLE is this
+        """
+        return list(self._valid_types[independent, time_alignable])
 
     def import_types(self, template):
         """@template: filename of a .etf or .eaf with the types to be imported"""
-        types = [lt.get("LINGUISTIC_TYPE_ID") for lt in self.eafile.findall("LINGUISTIC_TYPE")]
-
-        etf = etree.parse(template).getroot()
-        ltnodes = etf.findall("LINGUISTIC_TYPE")
-        ltnodes = [lt for lt in ltnodes if lt.get("LINGUISTIC_TYPE_ID") not in types]
+        ltnodes = _template_types(template)
+        ltnodes = [lt for lt in ltnodes if lt.get("LINGUISTIC_TYPE_ID") not in self._types]
 
-        end_to_last = list(reversed([k.tag for k in list(self.eafile)])).index("LINGUISTIC_TYPE")
-        at_idx = len(list(self.eafile)) - end_to_last
+        at_idx = max(i for i, k in enumerate(self.eafile) if k.tag == "LINGUISTIC_TYPE") + 1
 
         for lt in ltnodes:
-            self.eafile.insert(at_idx, lt)
+            self.eafile.insert(at_idx, deepcopy(lt))
+        self._init_types()
 
     # def importTiers(): maybe better to use ELAN's multiple edit
 
-    def write(self, filename):
-        with open(filename, "w", encoding="utf-8") as outstr:
-            outstr.write(etree.tostring(self.eafile, encoding="unicode"))
+    def write(self, filename, skip_unchanged=False, buffer_size=2**20, patch=False):
+        """Write the EAF to @filename, streaming it into a temporary file that then replaces it
+        @skip_unchanged: leave @filename untouched if it already holds exactly these bytes
+        @buffer_size: size in bytes of the blocks written to disk
+        @patch: if the Eaf is patchable and only ANNOTATION_VALUE texts were edited, copy the
+        source file with just those values replaced, instead of serializing the whole tree
+
+        Returns True if @filename was (re)written.
+        """
+        self._materialize()
+        if patch and self._values is None:
+            print("WARNING: not opened as patchable, so writing", filename, "in full")
+            patch = False
+        elif patch and self._layout() != self._layout_digest:
+            print("WARNING: more than annotation values changed, so writing", filename, "in full")
+            patch = False
+
+        head, tail = os.path.split(os.path.abspath(filename))
+        tmp = os.path.join(head, f".{tail}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "wb", buffering=buffer_size) as outstr:
+                if patch:
+                    self._write_patched(outstr, buffer_size)
+                else:
+                    etree.ElementTree(self.eafile).write(outstr, encoding="utf-8")
+            if (
+                skip_unchanged
+                and os.path.exists(filename)
+                and filecmp.cmp(tmp, filename, shallow=False)
+            ):
+                os.remove(tmp)
+                return False
+            os.replace(tmp, filename)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        if self._values is not None and os.path.abspath(self.filename) == os.path.join(head, tail):
+            # the recorded byte spans no longer describe the file on disk
+            self._values = None
+        return True
 
     def status(self, fields=None):
         """Report percent coverage of dependent tiers"""
-        if fields is None:
-            fnames = self.get_tier_ids()
-        else:
-            fnames = [f for f in self.get_tier_ids() if f.partition("@")[0] in fields]
-        coverage = {}
-        spkrs = set([f.partition("@")[2] for f in fnames])
-        for spkr in spkrs:
-            fset = [f for f in fnames if f.partition("@")[2] == spkr]
-            baseline = fset[0]
-            basenotes = self.get_annotations_in(baseline)
-            for f in fset:
-                count = 0
-                if len(basenotes) > 0:
-                    for bn in basenotes:
-                        start, stop = self.get_time(bn)
-                        fn = [
-                            n
-                            for n in self.get_annotations_in(f, start, stop)
-                            if n.findtext("ANNOTATION_VALUE").strip() != ""
-                        ]
-                        if len(fn) > 0:
-                            count += 1
-                    coverage[f] = round(float(count) / len(basenotes), 2)
-                else:
-                    coverage[f] = 0
-        return coverage
+        return self.columns(_select_tiers(self.get_tier_ids(), fields)).status(fields)
 
-    def export_to_csv(self, filename, dialect="excel", fields=None, mode="w"):
+    def export_to_csv(self, filename, dialect="excel", fields=None, mode="w", wide=False):
         """Duplicate the ELAN export function, with our settings and safe csv format
         @filename: path of new csv file
         @dialect: a csv.Dialect instance or the name of a registered Dialect
         @fields: list of fields to export (default exports all)
         @mode: fopen mode code ('w' to overwrite, 'a' to append)
+        @wide: write one row per time segment with a column per field, as SegmentExport,
+        instead of one row per annotation
+        """
+        _export_to_csv(self, filename, dialect, fields, mode, wide)
+
+    def export_rows(self, fields=None):
+        """Generate (tier, start, end, value) for the annotations to export
+        @fields: list of fields to export (default exports all)
         """
-        if fields is None:
-            fnames = self.get_tier_ids()
+        return self.columns(_select_tiers(self.get_tier_ids(), fields)).export_rows(fields)
+
+    def _rows(self, fnames):
+        """Generate (tier, start, end, value) for the annotations on the tiers @fnames"""
+        return self.columns(fnames)._rows(fnames)
+
+    def columns(self, tiers=None):
+        """Get a column-oriented EafColumns copy of the annotations
+        @tiers: TIER_IDs to copy (default copies all); annotations referring to a tier
+        that is not copied get parent -1
+
+        status() and the exports are answered from this copy rather than the tree.
+        """
+        self._flush()
+        if tiers is None:
+            nodes = self._tier_order
+        else:
+            nodes = [t for t in self._tier_order if t.get("TIER_ID") in set(tiers)]
+        self._materialize(nodes)
+        nodes = set(nodes)
+        tids = self.get_tier_ids()
+        codes = {tid: tids.index(tid) for tid in tids}
+        for tid, matchlist in self._tiers.items():
+            if len(matchlist) > 1:
+                codes[tid] = self._tier_order.index(self.get_tier_by_id(tid))
+
+        tier, start, end = array("i"), array("q"), array("q")
+        parent, value = array("i"), array("i")
+        values = {}
+        rows = {}
+        refs = []
+        for code, t in enumerate(self._tier_order):
+            if t not in nodes:
+                continue
+            for note in t.iter():
+                if note.tag not in ("ALIGNABLE_ANNOTATION", "REF_ANNOTATION"):
+                    continue
+                aid = note.get("ANNOTATION_ID")
+                rows[aid] = len(tier)
+                times = self.times.get(aid) or (-1, -1)
+                text = (note.findtext("ANNOTATION_VALUE") or "").strip()
+                tier.append(code)
+                start.append(times[0])
+                end.append(times[1])
+                refs.append(note.get("ANNOTATION_REF"))
+                value.append(values.setdefault(text, len(values)))
+        parent.extend(rows.get(ref, -1) for ref in refs)
+        return EafColumns(tids, codes, tier, start, end, parent, value, list(values), self.filename)
+
+
+class EafColumns:
+    """Column-oriented copy of the annotations of an Eaf, one row per annotation
+
+    Rows are in document order, so the rows of each tier are contiguous. The columns are
+    arrays: tier codes (indices into tier_ids), start and end times (-1 where unknown), the
+    row of the annotation each one refers to (-1 for time-aligned ones) and value ids
+    (indices into values, which holds each distinct stripped ANNOTATION_VALUE once).
+
+    Holds just enough to report status and export to csv, without the XML tree, and is
+    what EafCache stores.
+    """
+
+    def __init__(self, tier_ids, codes, tier, start, end, parent, value, values, filename=None):
+        """@codes: dict of TIER_ID -> tier code, choosing among duplicate TIER_IDs
+        @filename: path of the EAF the annotations come from
+        """
+        self.filename = filename
+        self.tier_ids = tier_ids
+        self.codes = codes
+        self.tier = tier
+        self.start = start
+        self.end = end
+        self.parent = parent
+        self.value = value
+        self.values = values
+        self.duration = max(end, default=0)
+
+        self._bounds = {}
+        for row, code in enumerate(tier):
+            lo, _hi = self._bounds.get(code, (row, row))
+            self._bounds[code] = (lo, row + 1)
+        self._by_start = {}
+
+    def __len__(self):
+        return len(self.tier)
+
+    def tier_rows(self, tid):
+        """Get the range of rows of the tier @tid (empty if there is no such tier)"""
+        lo, hi = self._bounds.get(self.codes.get(tid), (0, 0))
+        return range(lo, hi)
+
+    def _sorted(self, code):
+        """Get (starts, rows) for tier @code, sorted by start time, building it on first use"""
+        if code not in self._by_start:
+            lo, hi = self._bounds.get(code, (0, 0))
+            rows = array("i", sorted(range(lo, hi), key=self.start.__getitem__))
+            starts = array("q", (self.start[r] for r in rows))
+            self._by_start[code] = (starts, rows)
+        return self._by_start[code]
+
+    def select(self, tiers=None, start=0, stop=None):
+        """Get the rows of annotations on @tiers between @start and @stop, in document order
+        @tiers: TIER_IDs to look on (default looks on all tiers)
+        """
+        if stop is None:
+            stop = self.duration
+        if tiers is None:
+            codes = sorted(self._bounds)
         else:
-            fnames = [f for f in self.get_tier_ids() if f.partition("@")[0] in fields]
-
-        print("From", filename, "printing", fnames, "out of", self.get_tier_ids())
-        columns = ("fieldname", "start", "end", "value", "filename")
-        with open(filename, mode, encoding="utf-8", newline="") as csv_stream:
-            csvfile = csv.DictWriter(
-                csv_stream,
-                dialect=dialect,
-                fieldnames=columns,
+            codes = sorted(set(self.codes[t] for t in tiers if t in self.codes))
+        found = array("i")
+        for code in codes:
+            starts, rows = self._sorted(code)
+            hits = rows[bisect_left(starts, start) : bisect_right(starts, stop)]
+            found.extend(sorted(r for r in hits if self.end[r] <= stop))
+        return found
+
+    def get_values(self, rows):
+        """Get the ANNOTATION_VALUEs of @rows"""
+        return [self.values[self.value[r]] for r in rows]
+
+    def get_tier_ids(self):
+        return list(self.tier_ids)
+
+    def status(self, fields=None):
+        """Report percent coverage of dependent tiers, as Eaf.status"""
+        fnames = _select_tiers(self.tier_ids, fields)
+        return _coverage(fnames, {f: [r[1:] for r in self._rows([f])] for f in set(fnames)})
+
+    def export_to_csv(self, filename, dialect="excel", fields=None, mode="w", wide=False):
+        """Export to csv in the same format as Eaf.export_to_csv"""
+        _export_to_csv(self, filename, dialect, fields, mode, wide)
+
+    def export_rows(self, fields=None):
+        """Generate (tier, start, end, value) for the annotations to export, as Eaf.export_rows"""
+        return self._rows(_select_tiers(self.tier_ids, fields))
+
+    def iter_aligned(self, tiers):
+        """Generate (start, end, values) for each time segment, as Eaf.iter_aligned"""
+        streams = []
+        for idx, tid in enumerate(tiers):
+            found = self.select([tid])
+            rows = sorted(
+                (self.start[r], self.end[r], idx, n, self.values[self.value[r]])
+                for n, r in enumerate(found)
+            )
+            streams.append(rows)
+        return _merge_aligned(streams, len(tiers), str)
+
+    def export_segments(self, fields):
+        """Generate (start, end, speaker, values) for each time segment, as Eaf.export_segments"""
+        return _segments(self, fields)
+
+    def _rows(self, fnames):
+        for f in fnames:
+            for r in self.select([f]):
+                yield f, self.start[r], self.end[r], self.values[self.value[r]]
+
+    def dumps(self):
+        arrays = []
+        for column in (self.tier, self.start, self.end, self.parent, self.value):
+            # times of up to 596 hours fit in 4 bytes
+            if (
+                column.typecode == "q"
+                and -(2**31) <= min(column, default=0) <= max(column, default=0) < 2**31
+            ):
+                column = array("i", column)
+            arrays.append((column.typecode, column.tobytes()))
+        return marshal.dumps((self.filename, self.tier_ids, self.codes, arrays, self.values))
+
+    @classmethod
+    def loads(cls, data):
+        filename, tier_ids, codes, arrays, values = marshal.loads(data)
+        columns = []
+        for typecode, (stored, raw) in zip("iqqii", arrays):
+            column = array(stored)
+            column.frombytes(raw)
+            columns.append(column if stored == typecode else array(typecode, column))
+        return cls(tier_ids, codes, *columns, values, filename)
+
+
+class EafCache:
+    """On-disk cache of EafColumns, keyed on the files they were made from
+
+    Entries are named by a hash of the path, size, mtime and content of each source file
+    (e.g. the EAF and the cleaning code), so any change to a source gives a new key. Once a
+    run of puts is done, evict() removes the least recently used entries beyond @max_bytes.
+    """
+
+    VERSION = 2  # bump to invalidate old entries when the stored format changes
+
+    def __init__(self, directory, max_bytes=256 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, *sources, extra=()):
+        """Get the cache key for columns made from the files @sources
+        @extra: strings the columns also depend on, e.g. the type_digest of a template
+        """
+        digest = hashlib.sha1(str(self.VERSION).encode("ascii"))
+        for item in extra:
+            digest.update(f"\0{item}\0".encode())
+        for source in sources:
+            st = os.stat(source)
+            stamp = f"\0{os.path.abspath(source)}\0{st.st_size}\0{st.st_mtime_ns}\0"
+            digest.update(stamp.encode("utf-8"))
+            with open(source, "rb") as stream:
+                for chunk in iter(lambda: stream.read(2**20), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".snap")
+
+    def get(self, key):
+        """Get the EafColumns stored under @key, or None"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as stream:
+                columns = EafColumns.loads(stream.read())
+            os.utime(path)  # mark as recently used
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        return columns
+
+    def put(self, key, columns):
+        """Store the EafColumns @columns under @key (the size limit is applied by evict)"""
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as stream:
+            stream.write(columns.dumps())
+        os.replace(tmp, self._path(key))
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".snap"):
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:  # evicted by another process
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, name))
+        total = sum(size for _mtime, size, _name in entries)
+        for _mtime, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            with suppress(FileNotFoundError):
+                os.remove(os.path.join(self.directory, name))
+            total -= size
+
+
+_CSV_COLUMNS = ("fieldname", "start", "end", "value", "filename")
+
+
+_SEGMENT_COLUMNS = ("filename", "start", "end", "speaker")
+
+
+def _stripped_value(note):
+    """Get the stripped ANNOTATION_VALUE text of annotation @note"""
+    return note.findtext("ANNOTATION_VALUE").strip()
+
+
+def _merge_aligned(streams, width, value):
+    """Merge @streams of (start, end, tier index, order, item), each sorted, into
+    (start, end, values) rows as described for Eaf.iter_aligned
+    @width: number of tiers
+    @value: function from an item to its value
+    """
+    start = end = values = None
+    for t0, t1, idx, _order, item in heapq.merge(*streams):
+        if values is None or (t0, t1) != (start, end):
+            if values is not None:
+                yield start, end, values
+            start, end, values = t0, t1, [None] * width
+        values[idx] = value(item)
+    if values is not None:
+        yield start, end, values
+
+
+def _field_names(tids):
+    """Get the distinct fields (the part before any '@') of the TIER_IDs @tids, in order"""
+    return list(dict.fromkeys(t.partition("@")[0] for t in tids))
+
+
+def _export_to_csv(eafile, filename, dialect="excel", fields=None, mode="w", wide=False):
+    """Export the annotations of @eafile (an Eaf or EafColumns) to @filename, with the
+    arguments described for Eaf.export_to_csv
+    """
+    fnames = _select_tiers(eafile.get_tier_ids(), fields)
+
+    print("From", filename, "printing", fnames, "out of", eafile.get_tier_ids())
+    if wide:
+        with SegmentExport(filename, fields or _field_names(fnames), dialect, mode) as export:
+            export.add(eafile)
+    else:
+        with CsvExport(filename, dialect, mode) as export:
+            export.add(eafile, fields)
+
+
+def _segments(eafile, fields):
+    """Generate (start, end, speaker, values) for each time segment of @eafile (an Eaf or
+    EafColumns) on the tiers of @fields
+
+    As in web.mk_table_rows, the values of tiers of the same field are joined in document
+    order, and the speaker is that of the last tier with a value, taking tiers in the order
+    of @fields.
+    """
+    fields = list(fields)
+    tnames = _select_tiers(eafile.get_tier_ids(), fields)
+    tnames.sort(key=lambda t: fields.index(t.partition("@")[0]))
+    columns = [fields.index(t.partition("@")[0]) for t in tnames]
+    speakers = [t.partition("@")[2] for t in tnames]
+    for start, end, values in eafile.iter_aligned(tnames):
+        row = [""] * len(fields)
+        speaker = ""
+        for col, spkr, value in zip(columns, speakers, values):
+            if value:
+                row[col] += value
+                speaker = spkr or speaker
+        yield start, end, speaker, row
+
+
+def _coverage(fnames, rows):
+    """Report the fraction of baseline annotations with non-blank annotations on each tier
+    @fnames: TIER_IDs to report, the first for each speaker being the baseline
+    @rows: dict of TIER_ID -> list of (start, end, value), in document order
+
+    A baseline annotation counts as covered on a tier if a non-blank annotation on that tier
+    lies within it. Each speaker's tiers are checked in a single sweep over the baseline
+    annotations in order of start time.
+    """
+    coverage = {}
+    spkrs = set([f.partition("@")[2] for f in fnames])
+    for spkr in spkrs:
+        fset = [f for f in fnames if f.partition("@")[2] == spkr]
+        baseline = fset[0]
+        basenotes = rows[baseline]
+        if len(basenotes) == 0:
+            for f in fset:
+                coverage[f] = 0
+            continue
+
+        tracks = []
+        for f in fset:
+            notes = sorted((start, stop) for start, stop, value in rows[f] if value.strip())
+            starts = [start for start, _stop in notes]
+            # earliest end among the annotations starting at or after each position
+            ends = list(accumulate(reversed([stop for _start, stop in notes]), min))
+            ends.reverse()
+            ends.append(float("inf"))
+            tracks.append((starts, ends))
+
+        counts = [0] * len(fset)
+        pos = [0] * len(fset)
+        for start, stop in sorted((start, stop) for start, stop, _value in basenotes):
+            for k, (starts, ends) in enumerate(tracks):
+                while pos[k] < len(starts) and starts[pos[k]] < start:
+                    pos[k] += 1
+                if ends[pos[k]] <= stop:
+                    counts[k] += 1
+        for f, count in zip(fset, counts):
+            coverage[f] = round(float(count) / len(basenotes), 2)
+    return coverage
+
+
+def _select_tiers(tids, fields=None):
+    """Get the TIER_IDs in @tids whose field (the part before any '@') is in @fields"""
+    if fields is None:
+        return list(tids)
+    return [f for f in tids if f.partition("@")[0] in fields]
+
+
+class CsvExport:
+    """Export session writing the annotations of many EAFs to one csv file
+
+    The file is opened once and written through a large buffer. Rows can come from Eaf
+    or EafColumns objects, or as (tier, start, end, value) tuples, e.g. from other
+    processes. Use it as a context manager, or call close() when done.
+    """
+
+    columns = _CSV_COLUMNS
+
+    def __init__(self, filename, dialect="excel", mode="w", compress=None, buffer_size=2**20):
+        """@filename: path of the csv file
+        @dialect: a csv.Dialect instance or the name of a registered Dialect
+        @mode: fopen mode code ('w' to overwrite, with a header row, or 'a' to append)
+        @compress: write gzip (default is to compress if @filename ends with .gz)
+        @buffer_size: size in bytes of the blocks written to disk
+        """
+        if compress is None:
+            compress = filename.endswith(".gz")
+        mode = mode.replace("b", "").replace("t", "")
+        with ExitStack() as stack:
+            if compress:
+                binary = stack.enter_context(gzip.open(filename, mode + "b"))
+            else:
+                binary = stack.enter_context(open(filename, mode + "b", buffering=0))
+            self._stream = stack.enter_context(
+                io.TextIOWrapper(
+                    io.BufferedWriter(binary, buffer_size), encoding="utf-8", newline=""
+                )
             )
+            self._csv = csv.writer(self._stream, dialect=dialect)
             if "w" in mode:
-                csvfile.writeheader()
-
-            for f in fnames:
-                annots = self.get_annotations_in(f)
-                for a in annots:
-                    value = a.findtext("ANNOTATION_VALUE").strip()
-                    start, end = [str(t) for t in self.get_time(a)]
-                    row = {
-                        "fieldname": f,
-                        "start": start,
-                        "end": end,
-                        "value": value,
-                        "filename": self.filename,
-                    }
-                    csvfile.writerow(row)
+                self._csv.writerow(self.columns)
+            # the session owns the file from here until close()
+            self._files = stack.pop_all()
+
+    def add(self, eafile, fields=None):
+        """Write the annotations of @eafile (an Eaf or EafColumns) on the tiers of @fields"""
+        self.write_rows(eafile.export_rows(fields), eafile.filename)
+
+    def write_rows(self, rows, source):
+        """Write (tier, start, end, value) @rows from the EAF named @source"""
+        self._csv.writerows(
+            (f, str(start), str(end), value, source) for f, start, end, value in rows
+        )
+
+    def close(self):
+        self._files.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SegmentExport(CsvExport):
+    """Export session writing one row per time segment of many EAFs to one csv file
+
+    Each row has the filename, start, end and speaker of a segment, and then a column for each
+    field, with the annotations of that field's tiers on exactly that segment.
+    """
+
+    def __init__(
+        self, filename, fields, dialect="excel", mode="w", compress=None, buffer_size=2**20
+    ):
+        """@fields: list of the fields to export, one column each
+        (the other arguments are as for CsvExport)
+        """
+        self.fields = list(fields)
+        self.columns = _SEGMENT_COLUMNS + tuple(self.fields)
+        super().__init__(filename, dialect, mode, compress, buffer_size)
+
+    def add(self, eafile, fields=None):
+        """Write the segments of @eafile (an Eaf or EafColumns) on the tiers of our fields"""
+        self.write_rows(eafile.export_segments(self.fields), eafile.filename)
+
+    def write_rows(self, rows, source):
+        """Write (start, end, speaker, values) @rows from the EAF named @source"""
+        self._csv.writerows(
+            (source, str(start), str(end), speaker, *values) for start, end, speaker, values in rows
+        )
+
+
+def iter_annotations(filename, fields=None):
+    """Stream (tier, start, end, value) for the annotations of an EAF, without building its tree
+    @filename: path of the EAF
+    @fields: list of fields to read (default reads all)
+
+    REF_ANNOTATIONs get the times of their timed ancestor, as in Eaf.get_time. Elements are
+    cleared as soon as they are read, so only the times of annotations are kept in memory.
+    Annotations come out in document order, except that one referring to an annotation further
+    down the file comes out as soon as that annotation is read.
+    """
+    slots = {}
+    times = {}
+    waiting = {}  # ANNOTATION_REF -> annotations that were read before their referent
+    prev = 0
+    tid = None
+    wanted = False
+    for event, elem in etree.iterparse(filename, events=("start", "end")):
+        if event == "start":
+            if elem.tag == "TIER":
+                tid = elem.get("TIER_ID")
+                wanted = fields is None or tid.partition("@")[0] in fields
+            continue
+
+        if elem.tag == "TIME_SLOT":
+            prev = int(elem.get("TIME_VALUE", default=prev + 1))  # default to one millisecond more
+            slots[elem.get("TIME_SLOT_ID")] = prev
+            elem.clear()
+            continue
+        if elem.tag in ("ANNOTATION", "TIER"):
+            elem.clear()
+            continue
+        if elem.tag == "ALIGNABLE_ANNOTATION":
+            span = (slots[elem.get("TIME_SLOT_REF1")], slots[elem.get("TIME_SLOT_REF2")])
+        elif elem.tag == "REF_ANNOTATION":
+            span = times.get(elem.get("ANNOTATION_REF"))
+        else:
+            continue
+
+        value = (elem.findtext("ANNOTATION_VALUE") or "").strip() if wanted else None
+        note = (tid if wanted else None, elem.get("ANNOTATION_ID"), value)
+        if span is None:
+            waiting.setdefault(elem.get("ANNOTATION_REF"), []).append(note)
+            continue
+
+        resolved = deque([(note, span)])
+        while resolved:
+            (f, aid, value), span = resolved.popleft()
+            times[aid] = span
+            if f is not None:
+                yield f, span[0], span[1], value
+            resolved.extend((dep, span) for dep in waiting.pop(aid, []))
+
+    for ref, notes in waiting.items():
+        print("WARNING: no times found for", [aid for _f, aid, _v in notes], "referring to", ref)
+
+
+def read_header(filename, chunk_size=4096):
+    """Read the HEADER of an EAF, without reading any further into the file
+    @filename: path of the EAF
+    @chunk_size: number of bytes read at a time
+
+    Returns a dict with the MEDIA_URL and RELATIVE_MEDIA_URL of each MEDIA_DESCRIPTOR (as
+    lists), the TIME_UNITS, and the lastUsedAnnotationId property (None if missing).
+    """
+    header = {
+        "MEDIA_URL": [],
+        "RELATIVE_MEDIA_URL": [],
+        "TIME_UNITS": None,
+        "lastUsedAnnotationId": None,
+    }
+    parser = etree.XMLPullParser(events=("start", "end"))
+    with open(filename, "rb") as stream:
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == "start" and elem.tag == "HEADER":
+                    header["TIME_UNITS"] = elem.get("TIME_UNITS")
+                elif event == "end" and elem.tag == "MEDIA_DESCRIPTOR":
+                    header["MEDIA_URL"].append(elem.get("MEDIA_URL"))
+                    header["RELATIVE_MEDIA_URL"].append(elem.get("RELATIVE_MEDIA_URL"))
+                elif event == "end" and elem.tag == "PROPERTY":
+                    if elem.get("NAME") == "lastUsedAnnotationId":
+                        header["lastUsedAnnotationId"] = elem.text
+                elif event == "end" and elem.tag == "HEADER":
+                    return header
+    return header
+
+
+def stream_to_csv(eaf_filename, filename, dialect="excel", fields=None, mode="w"):
+    """Export an EAF straight from disk, in the same format as Eaf.export_to_csv
+    @eaf_filename: path of the EAF, which is read incrementally
+    @filename: path of new csv file
+    @dialect: a csv.Dialect instance or the name of a registered Dialect
+    @fields: list of fields to export (default exports all)
+    @mode: fopen mode code ('w' to overwrite, 'a' to append)
+    """
+    with CsvExport(filename, dialect, mode) as export:
+        export.write_rows(iter_annotations(eaf_filename, fields), eaf_filename)
 
 
 if __name__ == "__main__":
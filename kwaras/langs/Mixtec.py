@@ -129,6 +129,14 @@ def convert_to_ortho(text):
     return text
 
 
+def _phonetic_value(note):
+    """Get the IPA transcription of the orthographic annotation @note"""
+    text = note.find("ANNOTATION_VALUE").text
+    if text is not None:
+        text = convert_to_ipa(text)
+    return text
+
+
 def clean_eaf(fname, template=None):
     eafile = eaf.Eaf(fname)
     tiers = eafile.get_tier_ids()
@@ -152,16 +160,15 @@ def clean_eaf(fname, template=None):
                 eafile.get_tier_by_id("Phonetic"), "Phonetic-bk"
             )  # should be blank tiers only
 
-        phontier = eafile.copy_tier(
-            "Orthographic", "Phonetic", parent="Orthographic", ltype="Alternate transcription"
-        )
-        eafile.insert_tier(phontier, after="Orthographic")
-
         # use IPA
-        phonnotes = eafile.get_tier_by_id("Phonetic").iter("ANNOTATION_VALUE")
-        for note in phonnotes:
-            if note.text is not None:
-                note.text = convert_to_ipa(note.text)
+        eafile.derive_tier(
+            "Orthographic",
+            "Phonetic",
+            _phonetic_value,
+            ltype="Alternate transcription",
+            parent="Orthographic",
+            after="Orthographic",
+        )
 
     elif has_ipa and not has_ortho:
         # generate orthographic transcription from phonetic transcription
@@ -178,10 +185,13 @@ def clean_eaf(fname, template=None):
         eafile.rename_tier(eafile.get_tier_by_id("IPA Transcription"), "Orthographic")
 
         # copy old IPA transcription to new dependent tier
-        phontier = eafile.copy_tier(
-            "Orthographic", "Phonetic", parent="Orthographic", ltype="Alternate transcription"
+        eafile.derive_tier(
+            "Orthographic",
+            "Phonetic",
+            ltype="Alternate transcription",
+            parent="Orthographic",
+            after="Orthographic",
         )
-        eafile.insert_tier(phontier, after="Orthographic")
 
         # use new orthography
         orthnotes = eafile.get_tier_by_id("Orthographic").iter("ANNOTATION_VALUE")
@@ -198,10 +208,13 @@ def clean_eaf(fname, template=None):
         eafile.rename_tier(eafile.get_tier_by_id("Phonetic"), "Orthographic")
 
         # copy old IPA transcription to new dependent tier
-        phontier = eafile.copy_tier(
-            "Orthographic", "Phonetic", parent="Orthographic", ltype="Alternate transcription"
+        eafile.derive_tier(
+            "Orthographic",
+            "Phonetic",
+            ltype="Alternate transcription",
+            parent="Orthographic",
+            after="Orthographic",
         )
-        eafile.insert_tier(phontier, after="Orthographic")
 
         # use new orthography
         orthnotes = eafile.get_tier_by_id("Orthographic").iter("ANNOTATION_VALUE")
@@ -129,14 +129,15 @@ def orth2NewOrth(u):
 def clean_eaf(fname, template=None):
     eafile = eaf.Eaf(fname)
 
-    if template is not None:
-        eafile.import_types(template)
+    with eafile.batch():
+        if template is not None:
+            eafile.import_types(template)
 
-    tids = eafile.get_tier_ids()
-    spkrs = set([s.partition("@")[2] for s in tids])
+        tids = eafile.get_tier_ids()
+        spkrs = set([s.partition("@")[2] for s in tids])
 
-    for s in spkrs:
-        clean_eaf_block(eafile, s)
+        for s in spkrs:
+            clean_eaf_block(eafile, s)
 
     return eafile
 
@@ -167,9 +168,8 @@ def clean_eaf_block(eafile, spkr=""):
             eafile.rename_tier(orthbk, _orthtier + "_bk")
         if _orthtier not in eafile.get_tier_ids():
             # there is not yet an orthtier, so make it
-            bktier = eafile.copy_tier(_basetier, targ_id=_orthtier,
-                                      parent=_basetier, ltype="Alternate transcription")
-            eafile.insert_tier(bktier, after=_basetier)
+            eafile.derive_tier(_basetier, _orthtier, ltype="Alternate transcription",
+                               parent=_basetier, after=_basetier)
 
             # use IPA in baseline tier
             basenotes = eafile.get_tier_by_id(_basetier).iter("ANNOTATION_VALUE")
@@ -184,9 +184,8 @@ def clean_eaf_block(eafile, spkr=""):
         if _orth2tier in eafile.get_tier_ids():
             print(_orth2tier, "already exists")
         else:
-            neworth = eafile.copy_tier(_orthtier, targ_id=_orth2tier,
-                                       parent=_basetier, ltype="Alternate transcription")
-            eafile.insert_tier(neworth, after=_orthtier)
+            eafile.derive_tier(_orthtier, _orth2tier, ltype="Alternate transcription",
+                               parent=_basetier, after=_orthtier)
         onotes = eafile.get_tier_by_id(_orthtier).iter("[ANNOTATION_VALUE]")
         for on in onotes:
             print(on, on.tag, on.attrib)
@@ -206,56 +205,63 @@ def clean_eaf_block(eafile, spkr=""):
                 note.text = note.text.strip()
                 # print ">",note.text
 
+    def word_glosses(annot):
+        times = eafile.get_time(annot)
+        glosses = eafile.get_annotations_in(_glosstier, times[0], times[1])
+        try:
+            ug = [g.find("ANNOTATION_VALUE").text for g in glosses]
+            ug = [g for g in ug if g is not None]
+            return " ".join(ug)
+        except:
+            print("What's wrong here:", [g.find("ANNOTATION_VALUE").text for g in glosses])
+            return annot.find("ANNOTATION_VALUE").text
+
     # make utterance-level gloss tier from word glosses
+    has_glosses = eafile.get_annotations_in(_glosstier) != []
     if _uttwgltier not in eafile.get_tier_ids() and _glosstier in eafile.get_tier_ids():
-        ugtier = eafile.copy_tier(_basetier, targ_id=_uttwgltier,
-                                  parent=_basetier, ltype="Glosses")
-        eafile.insert_tier(ugtier, after=_orthtier)
-    if _uttwgltier in eafile.get_tier_ids() and eafile.get_annotations_in(_glosstier) != []:
+        eafile.derive_tier(_basetier, _uttwgltier, word_glosses if has_glosses else None,
+                           ltype="Glosses", parent=_basetier, after=_orthtier)
+    elif _uttwgltier in eafile.get_tier_ids() and has_glosses:
         for annot in eafile.get_annotations_in(_uttwgltier):
-            times = eafile.get_time(annot)
-            glosses = eafile.get_annotations_in(_glosstier, times[0], times[1])
-            try:
-                ug = [g.find("ANNOTATION_VALUE").text for g in glosses]
-                ug = [g for g in ug if g is not None]
-                annot.find("ANNOTATION_VALUE").text = " ".join(ug)
-            except:
-                print("What's wrong here:", [g.find("ANNOTATION_VALUE").text for g in glosses])
+            annot.find("ANNOTATION_VALUE").text = word_glosses(annot)
+
+    def morph_glosses(annot):
+        utttab = "<table><tr>"
+        times = eafile.get_time(annot)
+        words = eafile.get_annotations_in(_wordtier, times[0], times[1])
+        for w in words:
+            wtimes = eafile.get_time(w)
+            tab = "<table>"
+            for tier in [_morphtier]:  # [_morphtier, _mcattier]:
+                morphs = eafile.get_annotations_in(tier, wtimes[0], wtimes[1])
+                morphs = [m.find("ANNOTATION_VALUE").text for m in morphs]
+                morphs = [m for m in morphs if m is not None]
+                tab += "<tr><td>" + "</td><td>".join(morphs) + "</td></tr>"
+            for tier in _mglosstiers:
+                morphs = eafile.get_annotations_in(tier, wtimes[0], wtimes[1])
+                morphs = [m.find("ANNOTATION_VALUE").text for m in morphs]
+                morphs = [m for m in morphs if m is not None]
+                tab += "<tr><td>" + "</td><td>".join(morphs) + "</td></tr>"
+            tab += "</table>"
+            utttab += "<td>" + tab + "</td>"
+        utttab += "</tr></table>"
+        return utttab
+        #             try:
+        #                 ug = [m.find("ANNOTATION_VALUE").text for m in morphs]
+        #                 ug = [m for m in ug if m is not None]
+        #                 annot.find("ANNOTATION_VALUE").text = "<tr><td>"+"</td><td>".join(ug)+"</tr>"
+        #             except:
+        #                 print "What's wrong here:",[g.find("ANNOTATION_VALUE").text for g in glosses]
+        #                 raise
 
     # make utterance-level gloss tier from morph glosses
+    has_morphs = eafile.get_annotations_in(_morphtier) != []
     if _uttmgltier not in eafile.get_tier_ids() and _morphtier in eafile.get_tier_ids():
-        umgltier = eafile.copy_tier(_basetier, targ_id=_uttmgltier,
-                                    parent=_basetier, ltype="Glosses")
-        eafile.insert_tier(umgltier, after=_orthtier)
-    if _uttmgltier in eafile.get_tier_ids() and eafile.get_annotations_in(_morphtier) != []:
+        eafile.derive_tier(_basetier, _uttmgltier, morph_glosses if has_morphs else None,
+                           ltype="Glosses", parent=_basetier, after=_orthtier)
+    elif _uttmgltier in eafile.get_tier_ids() and has_morphs:
         for annot in eafile.get_annotations_in(_uttmgltier):
-            utttab = "<table><tr>"
-            times = eafile.get_time(annot)
-            words = eafile.get_annotations_in(_wordtier, times[0], times[1])
-            for w in words:
-                wtimes = eafile.get_time(w)
-                tab = "<table>"
-                for tier in [_morphtier]:  # [_morphtier, _mcattier]:
-                    morphs = eafile.get_annotations_in(tier, wtimes[0], wtimes[1])
-                    morphs = [m.find("ANNOTATION_VALUE").text for m in morphs]
-                    morphs = [m for m in morphs if m is not None]
-                    tab += "<tr><td>" + "</td><td>".join(morphs) + "</td></tr>"
-                for tier in _mglosstiers:
-                    morphs = eafile.get_annotations_in(tier, wtimes[0], wtimes[1])
-                    morphs = [m.find("ANNOTATION_VALUE").text for m in morphs]
-                    morphs = [m for m in morphs if m is not None]
-                    tab += "<tr><td>" + "</td><td>".join(morphs) + "</td></tr>"
-                tab += "</table>"
-                utttab += "<td>" + tab + "</td>"
-            utttab += "</tr></table>"
-            annot.find("ANNOTATION_VALUE").text = utttab
-            #             try:
-            #                 ug = [m.find("ANNOTATION_VALUE").text for m in morphs]
-            #                 ug = [m for m in ug if m is not None]
-            #                 annot.find("ANNOTATION_VALUE").text = "<tr><td>"+"</td><td>".join(ug)+"</tr>"
-            #             except:
-            #                 print "What's wrong here:",[g.find("ANNOTATION_VALUE").text for g in glosses]
-            #                 raise
+            annot.find("ANNOTATION_VALUE").text = morph_glosses(annot)
 
     # make sure Note and Broad tiers are independent
     if _notetier in eafile.get_tier_ids():
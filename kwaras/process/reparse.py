@@ -90,8 +90,8 @@ if __name__ == "__main__":
     outfile = r"C:\Users\Public\Documents\ELAN\texts\temp\tx_maiwaachi.eaf"
     lexicon = r"C:\Users\Public\Documents\ELAN\ELAN.lift"
 
-    eafile = Eaf(testfile)
+    eafile = Eaf(testfile, patchable=True)
     eafl = Lift(lexicon)
     tiernames = {"m": "Morph", "g": _MGLOSS_TIER, "x": "MCat"}
     eafile = update(eafile, tiernames, eafl)
-    eafile.write(outfile)
+    eafile.write(outfile, patch=True)
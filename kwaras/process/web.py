@@ -42,6 +42,7 @@ Authors: Lucien Carroll, Russ Horton
 """
 
 import csv
+import hashlib
 import json
 import logging
 import os
@@ -49,12 +50,17 @@ import random
 import re
 import shutil
 import wave
-from xml.etree import ElementTree as etree
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import repeat
 
-from kwaras.formats import xlsx
+from kwaras.formats import eaf, xlsx
 
 logger = logging.getLogger(__file__)
 
+MANIFEST_VERSION = 1
+
 CITATION_COLUMNS = ["Speaker", "Citation", "Length"]
 HIDDEN_COLUMNS = ["Start", "Stop", "WAV", "EAF", "File", "Token"]
 
@@ -88,13 +94,8 @@ def filter_fields(fields, export_fields):
     return fnames, fields
 
 
-def export_elan(cfg, export_fields):
-    csvfile = csv.DictWriter(
-        open(os.path.join(cfg["FILE_DIR"], "status.csv"), mode="w", encoding="utf-8", newline=""),
-        fieldnames=["Filename", "Speaker"] + export_fields,
-    )
-    csvfile.writeheader()
-
+def get_language(cfg):
+    """Get the module with the cleaning rules for the configured language"""
     if cfg["LANGUAGE"].lower() == "raramuri":
         from kwaras.langs import Raramuri as language
     elif cfg["LANGUAGE"].lower() == "mixtec":
@@ -103,8 +104,104 @@ def export_elan(cfg, export_fields):
         from kwaras.langs import Kumiai as language
     else:
         from kwaras.langs import Other as language
+    return language
 
-    template = None
+
+def get_cache(cfg):
+    """Get the EafCache configured by EAF_CACHE and EAF_CACHE_MB"""
+    return eaf.EafCache(cfg["EAF_CACHE"], int(cfg.get("EAF_CACHE_MB", 256)) * 2**20)
+
+
+def export_eaf(cfg, filename, template, export_fields, cleaned=False):
+    """Clean one EAF from OLD_EAFS into NEW_EAFS.
+
+    Args:
+        cleaned: the copy in NEW_EAFS is up to date, so read it rather than cleaning again
+
+    Returns:
+        source, rows, status: the EAF path for the csv, its (tier, start, end, value)
+                              rows on @export_fields, and its sorted status items
+
+    """
+    language = get_language(cfg)
+    fpath = os.path.join(cfg["OLD_EAFS"], filename)
+    new_fpath = os.path.join(cfg["NEW_EAFS"], filename)
+    if cleaned:
+        # only the exported tiers need parsing
+        eafile = eaf.Eaf(new_fpath, lazy=True)
+    elif not cfg.get("EAF_CACHE"):
+        eafile = language.clean_eaf(fpath, template)
+        eafile.write(new_fpath, skip_unchanged=True)
+        eafile = eafile.columns()  # the rest only queries, so the tree can go
+    else:
+        cache = get_cache(cfg)
+        # the cleaned EAF depends on the source, the template's types and the cleaning code
+        key = cache.key(fpath, language.__file__, extra=[eaf.type_digest(template)])
+        eafile = cache.get(key) if os.path.exists(new_fpath) else None
+        if eafile is None:
+            eafile = language.clean_eaf(fpath, template)
+            eafile.write(new_fpath, skip_unchanged=True)
+            eafile = eafile.columns()
+            cache.put(key, eafile)
+        else:
+            logger.info("Using cached copy of %s", filename)
+    rows = list(eafile.export_rows(export_fields))
+    return fpath, rows, sorted(eafile.status(export_fields).items())
+
+
+def file_digest(path):
+    """Get the sha1 hex digest of the content of the file at path."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as stream:
+        for chunk in iter(lambda: stream.read(2**20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_file):
+    """Read the manifest of a previous build, or get an empty one."""
+    try:
+        with open(manifest_file, encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        logger.warning("Ignoring unreadable manifest %s", manifest_file)
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def save_manifest(manifest_file, manifest):
+    """Write the manifest of this build, replacing the old one only once complete."""
+    manifest["version"] = MANIFEST_VERSION
+    tmp = manifest_file + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, ensure_ascii=False)
+    os.replace(tmp, manifest_file)
+
+
+def export_elan(cfg, export_fields, jobs=1, manifest=None):
+    """Clean the EAFs, write status.csv and (unless DATA_CSV is false) data.csv.
+
+    Args:
+        jobs: number of processes cleaning EAFs at once; the output is
+              merged in filename order, so it is the same for any number
+        manifest: dict from load_manifest; EAFs whose content, template types,
+                  language module and export fields match it are read from
+                  NEW_EAFS instead of being cleaned again, and it is updated in
+                  place for this run (carried over entries keep their "clips")
+
+    Returns:
+        tiers, fields: the exported annotations, as from parse_export_file
+
+    """
+    csvfile = csv.DictWriter(
+        open(os.path.join(cfg["FILE_DIR"], "status.csv"), mode="w", encoding="utf-8", newline=""),
+        fieldnames=["Filename", "Speaker"] + export_fields,
+    )
+    csvfile.writeheader()
 
     cfg["CSV"] = os.path.join(cfg["FILE_DIR"], "data.csv")
     cfg["NEW_EAFS"] = os.path.join(cfg["OLD_EAFS"], "auto")
@@ -112,21 +209,74 @@ def export_elan(cfg, export_fields):
         os.mkdir(cfg["NEW_EAFS"])
     if os.path.exists(cfg["CSV"]):
         os.remove(cfg["CSV"])
+    export = None
+    if cfg.get("DATA_CSV", True):
+        export = eaf.CsvExport(cfg["CSV"], "excel", "a")
+    tiers = {}
+    fields = []
 
-    for filename in os.listdir(cfg["OLD_EAFS"]):
+    filenames = []
+    for filename in sorted(os.listdir(cfg["OLD_EAFS"])):
         if not os.path.splitext(filename)[1].lower() == ".eaf":
             logger.info("Skipping %s as not an eaf", filename)
         elif os.path.basename(filename).startswith("."):
             logger.info("Skipping hidden file: %s", filename)
         else:
-            fpath = os.path.join(cfg["OLD_EAFS"], filename)
-            if template is None:
-                template = fpath
-                logger.info("Using %s as template for ELAN types", fpath)
-            eafile = language.clean_eaf(fpath, template)
-            eafile.write(os.path.join(cfg["NEW_EAFS"], filename))
-            eafile.export_to_csv(cfg["CSV"], "excel", export_fields, "a")
-            status = sorted(eafile.status(export_fields).items())
+            filenames.append(filename)
+
+    template = None
+    if filenames:
+        template = os.path.join(cfg["OLD_EAFS"], filenames[0])
+        logger.info("Using %s as template for ELAN types", template)
+
+    # an EAF is only cleaned again if it or something its cleaning depends on changed
+    if manifest is None:
+        manifest = {}
+    inputs = {
+        "fields": export_fields,
+        "template": eaf.type_digest(template) if template else None,
+        "language": file_digest(get_language(cfg).__file__),
+    }
+    removed = sorted(set(manifest.get("eafs", {})) - set(filenames))
+    previous = manifest.get("eafs", {}) if manifest.get("inputs") == inputs else {}
+    manifest["inputs"] = inputs
+    manifest["eafs"] = entries = {}
+    cleaned = []
+    for filename in filenames:
+        digest = file_digest(os.path.join(cfg["OLD_EAFS"], filename))
+        entry = previous.get(filename, {})
+        new_fpath = os.path.join(cfg["NEW_EAFS"], filename)
+        if entry.get("digest") == digest and os.path.exists(new_fpath):
+            logger.info("Unchanged since the last build: %s", filename)
+            entries[filename] = entry
+            cleaned.append(True)
+        else:
+            entries[filename] = {"digest": digest}
+            cleaned.append(False)
+    for filename in removed:
+        logger.info("Removing the output of %s", filename)
+        if os.path.exists(os.path.join(cfg["NEW_EAFS"], filename)):
+            os.remove(os.path.join(cfg["NEW_EAFS"], filename))
+
+    work = partial(export_eaf, cfg)
+    args = (filenames, repeat(template), repeat(export_fields), cleaned)
+    pool = None
+    if jobs > 1:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        results = pool.map(work, *args)
+    else:
+        results = map(work, *args)
+
+    try:
+        for filename, (source, rows, status) in zip(filenames, results):
+            if export is not None:
+                export.write_rows(rows, source)
+            eaf_file = os.path.basename(source)
+            for atype, start, stop, value in rows:
+                if atype not in tiers:
+                    fields.append(atype)
+                    tiers[atype] = {}
+                tiers[atype][(eaf_file, start, stop)] = value
             logger.info("Status: %s", status)
             speakers = {k.partition("@")[2] for k, v in status}
             row = {s: {"Filename": filename, "Speaker": s} for s in speakers}
@@ -135,18 +285,34 @@ def export_elan(cfg, export_fields):
                 row[spkr][field] = f"{v*100}%"
             for r in row.values():
                 csvfile.writerow(r)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if export is not None:
+            export.close()
 
+    if cfg.get("EAF_CACHE"):
+        get_cache(cfg).evict()
 
-def main(cfg):
+    return tiers, fields
+
+
+def main(cfg, jobs=1):
     """Perform the metadata extraction and file renaming."""
     export_fields = [f.strip() for f in cfg["EXP_FIELDS"].split(",")]
     logger.info("Exporting fields: %s")
-    export_elan(cfg, export_fields)
-    logger.info("ELAN data exported.")
 
-    # Parse the ELAN export
-    tiers, fields = parse_export_file(cfg["CSV"])
-    logger.info("Export file parsed.")
+    # Only EAFs changed since the manifest of the last build are cleaned and clipped again.
+    # It is kept with the cleaned EAFs, out of the published WWW directory.
+    manifest_file = os.path.join(cfg["OLD_EAFS"], "auto", "manifest.json")
+    manifest = load_manifest(manifest_file)
+    old_eafs = manifest.get("eafs", {})
+    old_wavs = manifest.get("wavs", {})
+
+    tiers, fields = export_elan(cfg, export_fields, jobs, manifest)
+    logger.info("ELAN data exported.")
+    # EAFs carried over unchanged from the last build, which still list their clips
+    kept = {eaf_file for eaf_file, entry in manifest["eafs"].items() if "clips" in entry}
 
     # filter and sort field names
     fnames, fields = filter_fields(fields, export_fields)
@@ -161,12 +327,29 @@ def main(cfg):
             wav_file = find_wav_file(os.path.join(cfg["NEW_EAFS"], eaf_file))
             eaf_wav_files[eaf_file] = wav_file
 
+    # Cut clips recording by recording, each from start to end
+    clippables.sort(key=lambda k: (eaf_wav_files[k[0]], k[1], k[2], k[0]))
+
+    # Clips from unchanged EAFs and WAVs can be kept
+    wavs = {}
+    for wav_file in set(eaf_wav_files.values()):
+        wav_path = os.path.join(cfg["WAV"], wav_file)
+        if os.path.exists(wav_path):
+            st = os.stat(wav_path)
+            wavs[wav_file] = [st.st_size, st.st_mtime_ns]
+    reuse = set()
+    for eaf_file in kept:
+        wav_file = eaf_wav_files.get(eaf_file)
+        if wav_file in wavs and old_wavs.get(wav_file) == wavs[wav_file]:
+            reuse.update(manifest["eafs"][eaf_file]["clips"])
+
     # Get mapping between EAFs and speakers
     spkr_dict = get_speakers(cfg["META"])
 
     # Output for clip metadata
+    clip_csv = open(os.path.join(cfg["WWW"], "clip_metadata.csv"), "w", encoding="utf-8", newline="")
     clip_fh = csv.DictWriter(
-        open(os.path.join(cfg["WWW"], "clip_metadata.csv"), "w", encoding="utf-8", newline=""),
+        clip_csv,
         fieldnames = fnames + CITATION_COLUMNS + HIDDEN_COLUMNS,
     )
     table_fh = open(os.path.join(cfg["WWW"], "clip_metadata.html"), "w", encoding="utf-8")
@@ -215,8 +398,27 @@ def main(cfg):
 
     logger.info("Started clipping.")
 
-    mk_table_rows(clippables, eaf_wav_files, spkr_dict, tiers, fields, fnames, clip_fh, table_fh, tokens, cfg)
-
+    clipped = mk_table_rows(clippables, eaf_wav_files, spkr_dict, tiers, fields, fnames, clip_fh, table_fh, tokens,
+                            cfg, reuse)
+
+    # Record the clips of each EAF. Unchanged EAFs also keep the old clips that could not be
+    # made again this time, e.g. while their WAV is missing.
+    for eaf_file, entry in manifest["eafs"].items():
+        clips = clipped.get(eaf_file, [])
+        if eaf_file in kept:
+            clips += [c for c in entry["clips"]
+                      if c not in clips and os.path.exists(os.path.join(cfg["CLIPS"], c))]
+        entry["clips"] = clips
+    manifest["wavs"] = wavs
+
+    # Drop the clips of removed and re-exported EAFs that no EAF made this time
+    stale = {c for eaf_file, entry in old_eafs.items() if eaf_file not in kept for c in entry.get("clips", [])}
+    for clip_file in stale.difference(*clipped.values()):
+        if os.path.exists(os.path.join(cfg["CLIPS"], clip_file)):
+            os.remove(os.path.join(cfg["CLIPS"], clip_file))
+    save_manifest(manifest_file, manifest)
+
+    clip_csv.close()
     table_fh.write("</tbody>\n</table>\n")
     table_fh.close()
 
@@ -252,117 +454,183 @@ def wrap_html(cfg, wrapper):
     index_fh.close()
 
 
-def mk_table_rows(clippables, eaf_wav_files, spkr_dict, tiers, fields, fnames, clip_fh, table_fh, tokens, cfg):
-    comment_field = "Note"
-    already_clipped = set()
-
-    for eaf_file, start, stop in clippables:
+def mk_table_rows(clippables, eaf_wav_files, spkr_dict, tiers, fields, fnames, clip_fh, table_fh, tokens, cfg,
+                  reuse=()):
+    """Write a clip, a csv row and a table row for each of @clippables.
 
-        wav_file = eaf_wav_files[eaf_file]
+    Clips are cut in this thread through one open WavSource per WAV, so
+    @clippables should be sorted by WAV and start time. Their files are written
+    by cfg["CLIP_THREADS"] threads (default 4) while the next rows are
+    rendered; rows are written in
+    order once their clip is, and skipped if it fails; the segment is then
+    clipped for the next EAF that has it.
 
-        if (wav_file, start, stop) in already_clipped:
-            continue
-
-        vdict = {}
-        speaker = ""
-        for f in fields:
-            fname = f.partition("@")[0]
-            v = tiers[f].get((eaf_file, start, stop), "")
-            vdict[fname] = vdict.get(fname, "") + v
-            if v:
-                spkr_code = f.partition("@")[2]
-                if spkr_code:
-                    speaker = spkr_code
-        values = [vdict[f] for f in fnames]
-
-        clip_base = os.path.splitext(wav_file)[0] + "[" + human_time(start, True) + "-" + human_time(stop, True) + "]"
-        clip_base = clip_base.replace(".", "")
-        clip_base = clip_base.replace(":", "_")
-        cite_code = os.path.splitext(wav_file)[0] + ":" + human_time(start, padded=True)
-
-        # If the filename for output already exists, add a number to it
-        file_index = ""
-        if False:  # set to over-write
-            while os.path.exists(os.path.join(cfg["CLIPS"], clip_base + str(file_index) + ".wav")):
-                if file_index == "":
-                    file_index = 1
-                else:
-                    file_index += 1
-
-        clip_file = clip_base + str(file_index) + ".wav"
+    Args:
+        reuse: names of clips cut by an earlier build that are still valid,
+               so they are not cut again if they exist
 
-        # Convert the times into the
-        # human-friendly minute:second format.
-        start_human = human_time(start)
-        stop_human = human_time(stop)
-        length = stop - start
-        length_human = human_time(length)
+    Returns:
+        dict of EAF filename -> list of the clips made for it
 
-        # Write out the clip wav
+    """
+    comment_field = "Note"
+    already_clipped = set()
+    clipped = {}
+    source_file = source = None
+    threads = max(1, int(cfg.get("CLIP_THREADS", 4)))
+    pending = deque()  # (clip write job, segment, eaf_file, clip_file, csv row, html row)
+    queued = {}  # (wav_file, start, stop) -> clip write job of a pending row
+
+    def made(job):
+        """Wait for a clip write job, and tell if its clip was written"""
+        return job is None or job.exception() is None
+
+    def finish():
+        """Wait for the oldest clip, then write its rows if it was made"""
+        job, segment, eaf_file, clip_file, csv_row, html_row = pending.popleft()
+        if queued.get(segment) is job:
+            del queued[segment]
+        if job is not None:
+            try:
+                job.result()
+            except OSError:
+                logger.warning("Could not write clip '%s'", clip_file)
+                return
+        already_clipped.add(segment)
+        clipped.setdefault(eaf_file, []).append(clip_file)
+
+        clip_fh.writerow(csv_row)
         try:
-            res = clip_wav(os.path.join(cfg["WAV"], wav_file),
-                           os.path.join(cfg["CLIPS"], clip_file),
-                           start, stop)
-        except OSError:
-            logger.warning("No WAV file named '%s' found", wav_file)
-            continue
+            table_fh.write(html_row)
+        except UnicodeDecodeError as err:
+            logger.warning("Skipping annotation because it can't be decoded (%s): %s", err.message, repr(html_row))
 
-        if not res:
-            continue
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for eaf_file, start, stop in clippables:
 
-        already_clipped.add((wav_file, start, stop))
+            wav_file = eaf_wav_files[eaf_file]
 
-        # pull up name of speaker (contributor)
-        if speaker != "":
-            logger.info("Using speaker value from tier name: %s", speaker)
-        else:
-            wav_file_base = os.path.splitext(wav_file)[0]
-            if wav_file_base in spkr_dict:
-                speaker = spkr_dict[wav_file_base]
-                logger.info("Using speaker value from metadata: %s", speaker)
+            # A segment is only cut again if its earlier clip failed
+            segment = (wav_file, start, stop)
+            if segment in already_clipped or (segment in queued and made(queued[segment])):
+                continue
+
+            vdict = {}
+            speaker = ""
+            for f in fields:
+                fname = f.partition("@")[0]
+                v = tiers[f].get((eaf_file, start, stop), "")
+                vdict[fname] = vdict.get(fname, "") + v
+                if v:
+                    spkr_code = f.partition("@")[2]
+                    if spkr_code:
+                        speaker = spkr_code
+            values = [vdict[f] for f in fnames]
+
+            clip_base = (os.path.splitext(wav_file)[0] +
+                         "[" + human_time(start, True) + "-" + human_time(stop, True) + "]")
+            clip_base = clip_base.replace(".", "")
+            clip_base = clip_base.replace(":", "_")
+            cite_code = os.path.splitext(wav_file)[0] + ":" + human_time(start, padded=True)
+
+            # If the filename for output already exists, add a number to it
+            file_index = ""
+            if False:  # set to over-write
+                while os.path.exists(os.path.join(cfg["CLIPS"], clip_base + str(file_index) + ".wav")):
+                    if file_index == "":
+                        file_index = 1
+                    else:
+                        file_index += 1
+
+            clip_file = clip_base + str(file_index) + ".wav"
+
+            # Convert the times into the
+            # human-friendly minute:second format.
+            start_human = human_time(start)
+            stop_human = human_time(stop)
+            length = stop - start
+            length_human = human_time(length)
+
+            # Queue the clip wav
+            job = None
+            if not (clip_file in reuse and os.path.exists(os.path.join(cfg["CLIPS"], clip_file))):
+                if wav_file != source_file:
+                    if source is not None:
+                        source.close()
+                    source_file, source = wav_file, None
+                    try:
+                        source = WavSource(os.path.join(cfg["WAV"], wav_file))
+                    except OSError:
+                        pass
+                if source is None:
+                    logger.warning("No WAV file named '%s' found", wav_file)
+                    continue
+                # frames are read here, in clip order, so each read can continue the last one;
+                # only writing the clip files is left to the pool
+                data = source.cut(start, stop)
+                if data is None:
+                    logger.warning("Bad position %s for %s", start, clip_file)
+                    continue
+                job = pool.submit(source.write, os.path.join(cfg["CLIPS"], clip_file), data)
+            queued[segment] = job
+
+            # pull up name of speaker (contributor)
+            if speaker != "":
+                logger.info("Using speaker value from tier name: %s", speaker)
             else:
-                logger.warning("No metadata for %s found in metadata file", wav_file_base)
-                if comment_field in fnames:  # speaker annotation in comment field
-                    comment = values[fnames.index(comment_field)]
-                    if comment.strip() and re.match("[A-Z, ]+", comment.split()[0]):
-                        # formerly  == comment.split()[0].upper():
-                        speaker = comment.split()[0]
-                        logger.info("Using speaker value from comment field: %s", speaker)
-
-        row = {
-            **dict(zip(fnames, values)),
-            **dict(zip(
-                CITATION_COLUMNS + HIDDEN_COLUMNS,
-                [speaker, cite_code, length_human, start_human, stop_human, wav_file, eaf_file, clip_file, tokens[(eaf_file, start, stop)]],
-            )),
-        }
-        clip_fh.writerow(row)
-
-        row = "\n".join([f'<tr clip="{clip_file}">'] +
-                         [f"<td>{v}</td>" for v in values] +
-                         [f"<td>{v}</td>" for v in (speaker, cite_code, length_human,
-                                                              start_human, stop_human,
-                                                              wav_file, eaf_file)] +
-                         [f'<td> <a href="clips/{clip_file}" target="_blank">{clip_file}</a></td>'] +
-                         [f"<td>{tokens[(eaf_file, start, stop)]}</td>"],
-                         )
-        try:
-            table_fh.write(row)
-        except UnicodeDecodeError as err:
-            logger.warning("Skipping annotation because it can't be decoded (%s): %s", err.message, repr(row))
+                wav_file_base = os.path.splitext(wav_file)[0]
+                if wav_file_base in spkr_dict:
+                    speaker = spkr_dict[wav_file_base]
+                    logger.info("Using speaker value from metadata: %s", speaker)
+                else:
+                    logger.warning("No metadata for %s found in metadata file", wav_file_base)
+                    if comment_field in fnames:  # speaker annotation in comment field
+                        comment = values[fnames.index(comment_field)]
+                        if comment.strip() and re.match("[A-Z, ]+", comment.split()[0]):
+                            # formerly  == comment.split()[0].upper():
+                            speaker = comment.split()[0]
+                            logger.info("Using speaker value from comment field: %s", speaker)
+
+            csv_row = {
+                **dict(zip(fnames, values)),
+                **dict(zip(
+                    CITATION_COLUMNS + HIDDEN_COLUMNS,
+                    [speaker, cite_code, length_human, start_human, stop_human, wav_file, eaf_file, clip_file,
+                     tokens[(eaf_file, start, stop)]],
+                )),
+            }
+
+            html_row = "\n".join([f'<tr clip="{clip_file}">'] +
+                                 [f"<td>{v}</td>" for v in values] +
+                                 [f"<td>{v}</td>" for v in (speaker, cite_code, length_human,
+                                                            start_human, stop_human,
+                                                            wav_file, eaf_file)] +
+                                 [f'<td> <a href="clips/{clip_file}" target="_blank">{clip_file}</a></td>'] +
+                                 [f"<td>{tokens[(eaf_file, start, stop)]}</td>"],
+                                 )
+
+            # Only so many clips are queued before waiting for the oldest
+            pending.append((job, segment, eaf_file, clip_file, csv_row, html_row))
+            while len(pending) > 8 * threads:
+                finish()
+
+        while pending:
+            finish()
+
+    if source is not None:
+        source.close()
+    return clipped
 
 
 def find_wav_file(eaf_file):
     """Look through an EAF file to find the wav file it corresponds to."""
-    tree = etree.ElementTree()
-    tree.parse(eaf_file)
-    media = tree.find("HEADER/MEDIA_DESCRIPTOR")
-    if media is None:
-        logger.warning("No MEDIA_DESCRIPTOR tag found: %s", etree.tostring(tree.getroot())[:200])
+    media = eaf.read_header(eaf_file)["MEDIA_URL"]
+    if not media:
+        logger.warning("No MEDIA_DESCRIPTOR tag found in %s", eaf_file)
         basename = os.path.splitext(os.path.basename(eaf_file))[0]
         logger.info("Assuming %s.WAV", basename)
         return basename + ".WAV"
-    return os.path.basename(media.get("MEDIA_URL"))
+    return os.path.basename(media[0])
 
 
 def find_clippable_segments(tiers, fields):
@@ -477,8 +745,8 @@ def parse_export_file(filename, fields=()):
         for f in fields:
             tiers[f] = {}
         for line in fh:
-            atype, start, stop, value, eaf = line
-            key = (os.path.basename(eaf), int(start), int(stop))
+            atype, start, stop, value, eaf_file = line
+            key = (os.path.basename(eaf_file), int(start), int(stop))
             if atype in tiers:
                 tiers[atype][key] = value
             else:
@@ -491,7 +759,7 @@ def parse_export_file(filename, fields=()):
                 print(f"Warning: empty line in {filename}")
                 continue
             if len(line) == 5:
-                atype, start, stop, value, eaf = line
+                atype, start, stop, value, eaf_file = line
             else:
                 raise ValueError("""Line not in expected format:
                 """ + repr(line) + """
@@ -501,7 +769,7 @@ def parse_export_file(filename, fields=()):
                    - stop time in ms
                    - field value
                    - eaf filename""")
-            key = (os.path.basename(eaf), int(start), int(stop))
+            key = (os.path.basename(eaf_file), int(start), int(stop))
             if atype not in tiers:
                 fields.append(atype)
                 tiers[atype] = {}
@@ -510,6 +778,98 @@ def parse_export_file(filename, fields=()):
     return tiers, fields
 
 
+class WavSource:
+    """An open source WAV that clips are cut from.
+
+    Clips are cheapest when they are read in order of start time: the frames
+    read for one clip are kept, so an overlapping or adjacent clip only reads
+    what it adds, and the file is only seeked when there is a gap.
+    """
+
+    def __init__(self, wav_file):
+        """
+        @param wav_file: full path to the input wav
+        """
+        self.win = wave.open(wav_file, "rb")
+        self.params = self.win.getparams()
+        self.framerate = self.win.getframerate()
+        self.frame_size = self.win.getsampwidth() * self.win.getnchannels()
+        self.buffer = b""
+        self.buffer_start = 0  # frame position of buffer[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.win.close()
+        self.buffer = b""
+
+    def read(self, start_frame, frames):
+        """Get @frames frames from @start_frame on, reusing the previous read where it overlaps"""
+        buffer_end = self.buffer_start + len(self.buffer) // self.frame_size
+        if self.buffer_start <= start_frame <= buffer_end:
+            # drop what is before this clip, and continue reading where the last one stopped
+            self.buffer = self.buffer[(start_frame - self.buffer_start) * self.frame_size:]
+            if start_frame + frames > buffer_end:
+                self.buffer += self.win.readframes(start_frame + frames - buffer_end)
+        else:
+            self.win.setpos(start_frame)
+            self.buffer = self.win.readframes(frames)
+        self.buffer_start = start_frame
+        return self.buffer[:frames * self.frame_size]
+
+    def cut(self, start, stop):
+        """Get the frames from start to stop.
+
+        Args:
+            start: start time in milliseconds
+            stop: stop time in milliseconds
+
+        Returns:
+            bytes of the frames, or None if start is past the end of the source
+
+        """
+        length = stop - start
+        frames = int((length / 1000.0) * self.framerate)
+        start_frame = int((start / 1000.0) * self.framerate)
+        if not 0 <= start_frame <= self.params.nframes:
+            return None
+        return self.read(start_frame, frames)
+
+    def write(self, clip_file, data):
+        """Save frames from cut() to clip_file, with the parameters of the source.
+
+        This does not touch the source file, so clips can be written from other
+        threads while the next ones are cut.
+
+        """
+        with wave.open(clip_file, "wb") as wout:
+            wout.setparams(self.params)
+            wout.writeframes(data)
+
+    def clip(self, clip_file, start, stop):
+        """Clip from start to stop, save to clip_file.
+
+        Args:
+            clip_file: full path to output wav clip
+            start: start time in milliseconds
+            stop: stop time in milliseconds
+
+        Returns:
+            False if start is past the end of the source, else True
+
+        """
+        data = self.cut(start, stop)
+        if data is None:
+            logger.warning("Bad position %s for %s", start, clip_file)
+            return False
+        self.write(clip_file, data)
+        return True
+
+
 def clip_wav(wav_file, clip_file, start, stop):
     """Clip from start to stop in wav_file file, save to clip_file.
 
@@ -520,25 +880,8 @@ def clip_wav(wav_file, clip_file, start, stop):
         stop: stop time in wav_file in milliseconds
 
     """
-    win = wave.open(wav_file, "r")
-    framerate = win.getframerate()
-    length = stop - start
-    frames = int((length / 1000.0) * framerate)
-    start_frame = int((start / 1000.0) * framerate)
-    wout = wave.open(clip_file, "w")
-    wout.setparams(win.getparams())
-    try:
-        win.setpos(start_frame)
-    except wave.Error:
-        print("Bad position")
-        print()
-        return False
-    wout.setparams(win.getparams())
-    wout.writeframes(win.readframes(frames))
-    win.close()
-    wout.close()
-
-    return True
+    with WavSource(wav_file) as source:
+        return source.clip(clip_file, start, stop)
 
 
 def human_time(milliseconds, padded=False):
@@ -75,3 +75,122 @@ def temp_empty_config():
     ) as f:
         f.write("")
         return Path(f.name)
+
+
+SAMPLE_EAF = """<?xml version="1.0" encoding="UTF-8"?>
+<ANNOTATION_DOCUMENT AUTHOR="" DATE="2016-09-24T00:00:00-08:00" FORMAT="3.0" VERSION="3.0">
+    <HEADER MEDIA_FILE="" TIME_UNITS="milliseconds">
+        <MEDIA_DESCRIPTOR MEDIA_URL="file:///corpus/wav/session1.wav" MIME_TYPE="audio/x-wav" RELATIVE_MEDIA_URL="../wav/session1.wav"/>
+        <PROPERTY NAME="lastUsedAnnotationId">8</PROPERTY>
+    </HEADER>
+    <TIME_ORDER>
+        <TIME_SLOT TIME_SLOT_ID="ts1" TIME_VALUE="0"/>
+        <TIME_SLOT TIME_SLOT_ID="ts2" TIME_VALUE="1000"/>
+        <TIME_SLOT TIME_SLOT_ID="ts3" TIME_VALUE="1500"/>
+        <TIME_SLOT TIME_SLOT_ID="ts4" TIME_VALUE="2500"/>
+    </TIME_ORDER>
+    <TIER LINGUISTIC_TYPE_REF="Transcription" PARTICIPANT="A" TIER_ID="Broad@A">
+        <ANNOTATION>
+            <ALIGNABLE_ANNOTATION ANNOTATION_ID="a1" TIME_SLOT_REF1="ts1" TIME_SLOT_REF2="ts2">
+                <ANNOTATION_VALUE>ba ka</ANNOTATION_VALUE>
+            </ALIGNABLE_ANNOTATION>
+        </ANNOTATION>
+        <ANNOTATION>
+            <ALIGNABLE_ANNOTATION ANNOTATION_ID="a2" TIME_SLOT_REF1="ts3" TIME_SLOT_REF2="ts4">
+                <ANNOTATION_VALUE>ma</ANNOTATION_VALUE>
+            </ALIGNABLE_ANNOTATION>
+        </ANNOTATION>
+    </TIER>
+    <TIER LINGUISTIC_TYPE_REF="Free translation" PARENT_REF="Broad@A" PARTICIPANT="A" TIER_ID="English@A">
+        <ANNOTATION>
+            <REF_ANNOTATION ANNOTATION_ID="a3" ANNOTATION_REF="a1">
+                <ANNOTATION_VALUE>two words</ANNOTATION_VALUE>
+            </REF_ANNOTATION>
+        </ANNOTATION>
+        <ANNOTATION>
+            <REF_ANNOTATION ANNOTATION_ID="a4" ANNOTATION_REF="a2">
+                <ANNOTATION_VALUE></ANNOTATION_VALUE>
+            </REF_ANNOTATION>
+        </ANNOTATION>
+    </TIER>
+    <TIER LINGUISTIC_TYPE_REF="Words" PARENT_REF="Broad@A" PARTICIPANT="A" TIER_ID="Word@A">
+        <ANNOTATION>
+            <REF_ANNOTATION ANNOTATION_ID="a5" ANNOTATION_REF="a1">
+                <ANNOTATION_VALUE>ba</ANNOTATION_VALUE>
+            </REF_ANNOTATION>
+        </ANNOTATION>
+        <ANNOTATION>
+            <REF_ANNOTATION ANNOTATION_ID="a6" ANNOTATION_REF="a1" PREVIOUS_ANNOTATION="a5">
+                <ANNOTATION_VALUE>ka</ANNOTATION_VALUE>
+            </REF_ANNOTATION>
+        </ANNOTATION>
+    </TIER>
+    <TIER LINGUISTIC_TYPE_REF="Glosses" PARENT_REF="Word@A" PARTICIPANT="A" TIER_ID="Gloss@A">
+        <ANNOTATION>
+            <REF_ANNOTATION ANNOTATION_ID="a7" ANNOTATION_REF="a5">
+                <ANNOTATION_VALUE>two</ANNOTATION_VALUE>
+            </REF_ANNOTATION>
+        </ANNOTATION>
+        <ANNOTATION>
+            <REF_ANNOTATION ANNOTATION_ID="a8" ANNOTATION_REF="a6">
+                <ANNOTATION_VALUE>word</ANNOTATION_VALUE>
+            </REF_ANNOTATION>
+        </ANNOTATION>
+    </TIER>
+    <LINGUISTIC_TYPE GRAPHIC_REFERENCES="false" LINGUISTIC_TYPE_ID="Transcription" TIME_ALIGNABLE="true"/>
+    <LINGUISTIC_TYPE CONSTRAINTS="Symbolic_Association" GRAPHIC_REFERENCES="false" LINGUISTIC_TYPE_ID="Free translation" TIME_ALIGNABLE="false"/>
+    <LINGUISTIC_TYPE CONSTRAINTS="Symbolic_Association" GRAPHIC_REFERENCES="false" LINGUISTIC_TYPE_ID="Alternate transcription" TIME_ALIGNABLE="false"/>
+    <LINGUISTIC_TYPE CONSTRAINTS="Symbolic_Subdivision" GRAPHIC_REFERENCES="false" LINGUISTIC_TYPE_ID="Words" TIME_ALIGNABLE="false"/>
+    <LINGUISTIC_TYPE CONSTRAINTS="Symbolic_Association" GRAPHIC_REFERENCES="false" LINGUISTIC_TYPE_ID="Glosses" TIME_ALIGNABLE="false"/>
+    <CONSTRAINT DESCRIPTION="Symbolic association" STEREOTYPE="Symbolic_Association"/>
+    <CONSTRAINT DESCRIPTION="Symbolic subdivision" STEREOTYPE="Symbolic_Subdivision"/>
+</ANNOTATION_DOCUMENT>
+"""
+
+
+@pytest.fixture
+def sample_eaf_file(tmp_path):
+    """Create a small two-utterance EAF with dependent tiers."""
+    path = tmp_path / "session1.eaf"
+    path.write_text(SAMPLE_EAF, encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def corpus_cfg(tmp_path, monkeypatch):
+    """Create a three-file corpus with its WAVs, and the config to export it to the web."""
+    import random
+    import wave
+
+    eafs = tmp_path / "eafs"
+    wavs = tmp_path / "wav"
+    for d in (eafs, wavs, tmp_path / "www", tmp_path / "data"):
+        d.mkdir()
+    for name, media, word in [
+        ("s1", "session1", "ka"),
+        ("s2", "session2", "ki"),
+        ("s3", "session1", "ku"),
+    ]:
+        text = SAMPLE_EAF.replace("session1.wav", media + ".wav").replace(">ba ka<", f">ba {word}<")
+        (eafs / (name + ".eaf")).write_text(text, encoding="utf-8")
+    rand = random.Random(0)
+    for media in ("session1", "session2"):
+        with wave.open(str(wavs / (media + ".wav")), "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(8000)
+            w.writeframes(bytes(rand.randrange(256) for _ in range(2 * 8000 * 3)))
+
+    # main reads the page template and assets from web/ in the working directory
+    monkeypatch.chdir(Path(__file__).parent.parent)
+    return {
+        "LANGUAGE": "Other",
+        "FILE_DIR": str(tmp_path / "data"),
+        "OLD_EAFS": str(eafs),
+        "EXP_FIELDS": "Broad, English",
+        "META": str(tmp_path / "metadata.csv"),
+        "WAV": str(wavs),
+        "WWW": str(tmp_path / "www"),
+        "PG_TITLE": "Test Corpus",
+        "NAV_BAR": "",
+    }
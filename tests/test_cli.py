@@ -148,6 +148,18 @@ class TestParseArgs:
             assert args.command == "export-corpus"
             assert args.config == "test.cfg"
 
+    def test_parse_export_corpus_jobs(self):
+        """Test parsing the export-corpus process count."""
+        with patch("sys.argv", ["kwaras", "export-corpus", "--jobs", "8"]):
+            from kwaras.cli import parse_args
+
+            args = parse_args()
+            assert args.jobs == 8
+
+        with patch("sys.argv", ["kwaras", "export-corpus"]):
+            args = parse_args()
+            assert args.jobs == 1
+
     def test_parse_check_install_command(self):
         """Test parsing check-install subcommand."""
         with patch("sys.argv", ["kwaras", "check-install"]):
@@ -0,0 +1,924 @@
+"""Tests for the ELAN EAF reader and editor."""
+
+import pytest
+
+
+class TestTierIndex:
+    """Tests for tier lookup and tier edits."""
+
+    def test_get_tier_ids_in_document_order(self, sample_eaf_file):
+        """Test tier ids come back in document order."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+
+        assert eafile.get_tier_ids() == ["Broad@A", "English@A", "Word@A", "Gloss@A"]
+
+    def test_get_tier_by_id_missing_raises(self, sample_eaf_file):
+        """Test that an unknown TIER_ID raises NameError."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+
+        with pytest.raises(NameError):
+            eafile.get_tier_by_id("Spanish@A")
+
+    def test_rename_tier_updates_index_and_dependents(self, sample_eaf_file):
+        """Test that renaming a tier keeps lookups and PARENT_REFs current."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        eafile.rename_tier(eafile.get_tier_by_id("Broad@A"), "Ortho@A")
+
+        assert eafile.get_tier_ids()[0] == "Ortho@A"
+        assert eafile.get_tier_by_id("Ortho@A").get("TIER_ID") == "Ortho@A"
+        assert eafile.get_tier_by_id("English@A").get("PARENT_REF") == "Ortho@A"
+        with pytest.raises(NameError):
+            eafile.get_tier_by_id("Broad@A")
+
+    def test_insert_copied_tier(self, sample_eaf_file):
+        """Test that an inserted copy is indexed and renumbered."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        copy = eafile.copy_tier(
+            "Broad@A", "Ortho@A", parent="Broad@A", ltype="Alternate transcription"
+        )
+        eafile.insert_tier(copy, after="English@A")
+
+        assert eafile.get_tier_ids() == [t.get("TIER_ID") for t in eafile.eafile.findall("TIER")]
+        assert eafile.get_tier_by_id("Ortho@A") is copy
+        with pytest.raises(NameError):
+            eafile.insert_tier(copy)
+
+    def test_derive_tier(self, sample_eaf_file):
+        """Test that a derived tier refers to its parent and numbers its annotations in a block."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        ortho = eafile.derive_tier(
+            "Broad@A",
+            "Ortho@A",
+            lambda note: note.findtext("ANNOTATION_VALUE").upper(),
+            ltype="Alternate transcription",
+        )
+
+        notes = eafile.get_annotations_in("Ortho@A")
+        assert eafile.get_tier_by_id("Ortho@A") is ortho
+        assert ortho.get("PARENT_REF") == "Broad@A"
+        assert [n.get("ANNOTATION_ID") for n in notes] == ["a9", "a10"]
+        assert [n.get("ANNOTATION_REF") for n in notes] == ["a1", "a2"]
+        assert [n.get("PREVIOUS_ANNOTATION") for n in notes] == [None, None]
+        assert [n.findtext("ANNOTATION_VALUE") for n in notes] == ["BA KA", "MA"]
+        assert eafile.get_time(notes[1]) == [1500, 2500]
+        assert eafile.eafile.findtext("HEADER/PROPERTY[@NAME='lastUsedAnnotationId']") == "10"
+
+    def test_derive_tier_from_dependent(self, sample_eaf_file):
+        """Test deriving a sibling of a dependent tier, which copies values by default."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        eafile.derive_tier("English@A", "Spanish@A", parent="Broad@A", after="Word@A")
+
+        notes = eafile.get_annotations_in("Spanish@A")
+        assert eafile.get_tier_ids()[2] == "Spanish@A"
+        assert [n.get("ANNOTATION_REF") for n in notes] == ["a1", "a2"]
+        assert [n.findtext("ANNOTATION_VALUE") for n in notes] == ["two words", ""]
+        with pytest.raises(RuntimeWarning):
+            eafile.derive_tier("Broad@A", "Ortho@A", ltype="Transcription")
+
+    def test_derive_subdivision_tier(self, sample_eaf_file):
+        """Test that a subdivision links each annotation to the one before it under a parent."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        eafile.derive_tier("Word@A", "Token@A", ltype="Words", parent="Broad@A")
+
+        notes = eafile.get_annotations_in("Token@A")
+        assert [n.get("ANNOTATION_ID") for n in notes] == ["a9", "a10"]
+        assert [n.get("ANNOTATION_REF") for n in notes] == ["a1", "a1"]
+        assert [n.get("PREVIOUS_ANNOTATION") for n in notes] == [None, "a9"]
+        assert [n.findtext("ANNOTATION_VALUE") for n in notes] == ["ba", "ka"]
+
+    def test_derive_time_alignable_tier(self, sample_eaf_file, tmp_path):
+        """Test that a dependent time-alignable type gets a copy of the source's aligned tier."""
+        from kwaras.formats.eaf import Eaf
+
+        template = tmp_path / "template.etf"
+        template.write_text(
+            '<ANNOTATION_DOCUMENT><LINGUISTIC_TYPE CONSTRAINTS="Included_In" '
+            'LINGUISTIC_TYPE_ID="Phrase" TIME_ALIGNABLE="true"/></ANNOTATION_DOCUMENT>',
+            encoding="utf-8",
+        )
+        eafile = Eaf(str(sample_eaf_file))
+        eafile.import_types(str(template))
+        phrase = eafile.derive_tier(
+            "Broad@A",
+            "Phrase@A",
+            lambda note: note.findtext("ANNOTATION_VALUE").upper(),
+            ltype="Phrase",
+            after="English@A",
+        )
+
+        notes = eafile.get_annotations_in("Phrase@A")
+        assert eafile.get_tier_ids()[1] == "Phrase@A"
+        assert phrase.get("PARENT_REF") == "Broad@A"
+        assert [n.tag for n in notes] == ["ALIGNABLE_ANNOTATION"] * 2
+        assert [n.get("ANNOTATION_ID") for n in notes] == ["a9", "a10"]
+        assert [eafile.get_time(n) for n in notes] == [[0, 1000], [1500, 2500]]
+        assert [n.findtext("ANNOTATION_VALUE") for n in notes] == ["BA KA", "MA"]
+        assert eafile.get_annotations_in("Broad@A")[0].findtext("ANNOTATION_VALUE") == "ba ka"
+
+    def test_duplicate_tier_id_warns(self, sample_eaf_file, capsys):
+        """Test that duplicate TIER_IDs still warn and pick the largest tier."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        eafile.rename_tier(eafile.get_tier_by_id("Gloss@A"), "English@A")
+
+        tier = eafile.get_tier_by_id("English@A")
+
+        assert "WARNING: TIER_ID English@A matched 2 nodes" in capsys.readouterr().out
+        assert len(tier) == 2
+
+
+class TestIntervalIndex:
+    """Tests for time-range annotation queries."""
+
+    def test_get_annotations_in_range(self, sample_eaf_file):
+        """Test that only annotations inside the range are returned, in order."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+
+        ids = [a.get("ANNOTATION_ID") for a in eafile.get_annotations_in("Broad@A")]
+        assert ids == ["a1", "a2"]
+        ids = [a.get("ANNOTATION_ID") for a in eafile.get_annotations_in("Word@A", 0, 1000)]
+        assert ids == ["a5", "a6"]
+        assert eafile.get_annotations_in("Broad@A", 500, 2500)[0].get("ANNOTATION_ID") == "a2"
+        assert eafile.get_annotations_in("Spanish@A") == []
+
+    def test_get_annotation_at(self, sample_eaf_file):
+        """Test lookup of the annotation containing a time point."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+
+        assert eafile.get_annotation_at("Broad@A", 0).get("ANNOTATION_ID") == "a1"
+        assert eafile.get_annotation_at("English@A", 1600).get("ANNOTATION_ID") == "a4"
+        assert eafile.get_annotation_at("Broad@A", 1200) is None
+
+    def test_index_follows_inserted_tier(self, sample_eaf_file):
+        """Test that queries see a tier inserted after the index was built."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        eafile.get_annotations_in("English@A")
+        copy = eafile.copy_tier("English@A", "Spanish@A")
+        eafile.insert_tier(copy)
+
+        assert len(eafile.get_annotations_in("Spanish@A", 1500, 2500)) == 1
+
+
+class TestDependents:
+    """Tests for lookups of dependent REF_ANNOTATIONs."""
+
+    def test_get_annotation_on(self, sample_eaf_file):
+        """Test the symbolic association lookup on a named tier."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        word = eafile.get_annotations_in("Word@A")[1]
+
+        assert eafile.get_annotation_on("Gloss@A", word).get("ANNOTATION_ID") == "a8"
+        assert eafile.get_annotation_on("English@A", word) is None
+
+    def test_get_children(self, sample_eaf_file):
+        """Test that all dependents are returned in document order."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        utt = eafile.get_annotations_in("Broad@A")[0]
+
+        assert [a.get("ANNOTATION_ID") for a in eafile.get_children(utt)] == ["a3", "a5", "a6"]
+        assert [a.get("ANNOTATION_ID") for a in eafile.get_children(utt, "Word@A")] == ["a5", "a6"]
+
+
+class TestAnnotationIds:
+    """Tests for lookups by ANNOTATION_ID."""
+
+    def test_get_annotation(self, sample_eaf_file):
+        """Test that nested annotations are found by id, with their tier."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+
+        assert eafile.get_annotation("a7").findtext("ANNOTATION_VALUE") == "two"
+        assert eafile.get_tier_of("a7").get("TIER_ID") == "Gloss@A"
+        assert eafile.get_annotation("a99") is None
+
+    def test_get_annotation_after_insert(self, sample_eaf_file):
+        """Test that renumbered annotations of an inserted tier are found."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        eafile.insert_tier(eafile.copy_tier("English@A", "Spanish@A"))
+
+        assert eafile.get_annotation("a9").get("ANNOTATION_REF") == "a1"
+        assert eafile.get_tier_of("a10").get("TIER_ID") == "Spanish@A"
+        assert eafile.get_tier_of("a3").get("TIER_ID") == "English@A"
+
+
+class TestTimes:
+    """Tests for the times of annotations."""
+
+    def test_ref_annotation_times(self, sample_eaf_file):
+        """Test that REF_ANNOTATIONs inherit the times of their timed ancestor."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+
+        assert eafile.times["a4"] == [1500, 2500]
+        assert eafile.times["a8"] == [0, 1000]
+        assert eafile.times["ALL"] == (0, 2500)
+
+    def test_deep_ref_chain_times(self, sample_eaf_file):
+        """Test that times resolve through chains deeper than five links."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        parent = "Gloss@A"
+        for depth in range(8):
+            tier = eafile.copy_tier(parent, f"Depth{depth}@A", parent=parent)
+            for note, ref in zip(
+                tier.iter("REF_ANNOTATION"),
+                eafile.get_tier_by_id(parent).iter("REF_ANNOTATION"),
+            ):
+                note.set("ANNOTATION_REF", ref.get("ANNOTATION_ID"))
+            eafile.insert_tier(tier)
+            parent = tier.get("TIER_ID")
+
+        deepest = list(eafile.get_tier_by_id(parent).iter("REF_ANNOTATION"))
+        assert [eafile.get_time(n) for n in deepest] == [[0, 1000], [0, 1000]]
+
+
+class TestTypes:
+    """Tests for linguistic types."""
+
+    def test_import_types_parses_template_once(self, sample_eaf_file, tmp_path, monkeypatch):
+        """Test that a template is parsed once per version and its types are cloned."""
+        import os
+        import xml.etree.ElementTree as etree
+
+        from kwaras.formats.eaf import Eaf
+
+        template = tmp_path / "template.etf"
+        template.write_text(
+            '<ANNOTATION_DOCUMENT><LINGUISTIC_TYPE LINGUISTIC_TYPE_ID="Note" '
+            'TIME_ALIGNABLE="true"/></ANNOTATION_DOCUMENT>',
+            encoding="utf-8",
+        )
+        parsed = []
+        parse = etree.parse
+        monkeypatch.setattr(etree, "parse", lambda f: parsed.append(f) or parse(f))
+
+        first = Eaf(str(sample_eaf_file))
+        first.import_types(str(template))
+        second = Eaf(str(sample_eaf_file))
+        second.import_types(str(template))
+
+        assert len(parsed) == 3  # two EAFs and one template
+        assert "Note" in first.get_valid_types() and "Note" in second.get_valid_types()
+        path = "LINGUISTIC_TYPE[@LINGUISTIC_TYPE_ID='Note']"
+        assert first.eafile.find(path) is not second.eafile.find(path)
+
+        template.write_text(template.read_text().replace("Note", "Comment"), encoding="utf-8")
+        os.utime(str(template), ns=(0, 0))
+        second.import_types(str(template))
+        assert len(parsed) == 4
+        assert "Comment" in second.get_valid_types()
+
+    def test_valid_types_follow_imports(self, sample_eaf_file, tmp_path):
+        """Test that type lookups see imported types."""
+        from kwaras.formats.eaf import Eaf
+
+        template = tmp_path / "template.etf"
+        template.write_text(
+            '<ANNOTATION_DOCUMENT><LINGUISTIC_TYPE LINGUISTIC_TYPE_ID="Note" '
+            'TIME_ALIGNABLE="true"/></ANNOTATION_DOCUMENT>',
+            encoding="utf-8",
+        )
+        eafile = Eaf(str(sample_eaf_file))
+        assert eafile.get_valid_types(independent=False, time_alignable=False) == [
+            "Free translation",
+            "Alternate transcription",
+            "Words",
+            "Glosses",
+        ]
+
+        eafile.import_types(str(template))
+        eafile.change_parent(eafile.get_tier_by_id("English@A"), None, "Note")
+
+        assert eafile.get_valid_types(independent=True)[-1] == "Note"
+        assert eafile.get_tier_by_id("English@A").get("LINGUISTIC_TYPE_REF") == "Note"
+
+    def test_valid_types_are_indexed(self, sample_eaf_file):
+        """Test that every type lookup matches filtering the LINGUISTIC_TYPE nodes."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        nodes = eafile.eafile.findall("LINGUISTIC_TYPE")
+        for independent in (None, True, False):
+            for time_alignable in (None, True, False):
+                expected = [
+                    lt.get("LINGUISTIC_TYPE_ID")
+                    for lt in nodes
+                    if independent is None or ("CONSTRAINTS" not in lt.attrib) == independent
+                    if time_alignable is None
+                    or lt.get("TIME_ALIGNABLE") == str(time_alignable).lower()
+                ]
+                assert eafile.get_valid_types(independent, time_alignable) == expected
+
+        eafile.get_valid_types(independent=True).append("Nothing")
+        assert eafile.get_valid_types(independent=True) == ["Transcription"]
+
+    def test_type_digest(self, tmp_path):
+        """Test that the template digest only changes with its types."""
+        import os
+
+        from kwaras.formats.eaf import type_digest
+
+        template = tmp_path / "template.etf"
+        text = (
+            '<ANNOTATION_DOCUMENT><TIER TIER_ID="A"/><LINGUISTIC_TYPE LINGUISTIC_TYPE_ID="Note" '
+            'TIME_ALIGNABLE="true"/></ANNOTATION_DOCUMENT>'
+        )
+        template.write_text(text, encoding="utf-8")
+        digest = type_digest(str(template))
+
+        template.write_text(text.replace('"A"', '"B"'), encoding="utf-8")
+        os.utime(str(template), ns=(0, 0))
+        assert type_digest(str(template)) == digest
+
+        template.write_text(text.replace("true", "false"), encoding="utf-8")
+        os.utime(str(template), ns=(1, 1))
+        assert type_digest(str(template)) != digest
+
+
+class TestTierGraph:
+    """Tests for the parent-to-dependents tier index."""
+
+    def test_get_dependent_tiers(self, sample_eaf_file):
+        """Test direct and recursive dependents, in depth-first order."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+
+        assert eafile.get_dependent_tiers("Broad@A") == ["English@A", "Word@A"]
+        assert eafile.get_dependent_tiers("Broad@A", recursive=True) == [
+            "English@A",
+            "Word@A",
+            "Gloss@A",
+        ]
+        assert eafile.get_dependent_tiers("Gloss@A") == []
+
+    def test_dependents_follow_edits(self, sample_eaf_file):
+        """Test that renaming, reparenting and inserting tiers keep the index current."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        eafile.rename_tier(eafile.get_tier_by_id("Word@A"), "Token@A")
+        eafile.rename_tier(eafile.get_tier_by_id("Broad@A"), "Ortho@A")
+
+        assert eafile.get_dependent_tiers("Ortho@A") == ["English@A", "Token@A"]
+        assert eafile.get_dependent_tiers("Token@A") == ["Gloss@A"]
+        assert eafile.get_tier_by_id("Gloss@A").get("PARENT_REF") == "Token@A"
+
+        eafile.change_parent(eafile.get_tier_by_id("Gloss@A"), "Ortho@A")
+        eafile.derive_tier("English@A", "Spanish@A", parent="Ortho@A")
+
+        assert eafile.get_dependent_tiers("Token@A") == []
+        assert eafile.get_dependent_tiers("Ortho@A") == [
+            "English@A",
+            "Token@A",
+            "Gloss@A",
+            "Spanish@A",
+        ]
+
+
+class TestAligned:
+    """Tests for merging tiers into time segments."""
+
+    def test_iter_aligned(self, sample_eaf_file):
+        """Test that segments come in time order with one value per requested tier."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        tiers = ["English@A", "Broad@A", "Word@A", "Spanish@A"]
+
+        rows = list(eafile.iter_aligned(tiers))
+
+        assert rows == [
+            (0, 1000, ["two words", "ba ka", "ka", None]),
+            (1500, 2500, ["", "ma", None, None]),
+        ]
+
+        pivot = {}
+        for tid, start, end, value in eafile.export_rows():
+            pivot.setdefault((start, end), {})[tid] = value
+        assert [(r[0], r[1]) for r in rows] == sorted(pivot)
+        assert all(r[2][:3] == [pivot[r[:2]].get(t) for t in tiers[:3]] for r in rows)
+
+
+class TestBatch:
+    """Tests for batched tier edits."""
+
+    def test_batch_defers_indexing(self, sample_eaf_file):
+        """Test that inserted tiers are indexed on lookup or on leaving the batch."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        with eafile.batch():
+            eafile.insert_tier(eafile.copy_tier("English@A", "Spanish@A"))
+            eafile.insert_tier(eafile.copy_tier("Word@A", "Word-bk@A"))
+            assert "a9" not in eafile.times
+            assert eafile.get_tier_of("a9").get("TIER_ID") == "Spanish@A"
+            eafile.insert_tier(eafile.copy_tier("Gloss@A", "Gloss-bk@A"))
+        assert eafile.times["a13"] == [0, 1000]
+
+        utt = eafile.get_annotation("a1")
+        assert len(eafile.get_children(utt, "Spanish@A")) == 1
+        assert len(eafile.get_children(utt)) == 6
+
+
+class TestStreamingExport:
+    """Tests for exports read straight from disk."""
+
+    def test_iter_annotations(self, sample_eaf_file):
+        """Test streamed rows carry resolved times and stripped values."""
+        from kwaras.formats.eaf import iter_annotations
+
+        rows = list(iter_annotations(str(sample_eaf_file), ["English", "Gloss"]))
+
+        assert rows == [
+            ("English@A", 0, 1000, "two words"),
+            ("English@A", 1500, 2500, ""),
+            ("Gloss@A", 0, 1000, "two"),
+            ("Gloss@A", 0, 1000, "word"),
+        ]
+
+    def test_stream_to_csv_matches_export_to_csv(self, sample_eaf_file, tmp_path):
+        """Test the streamed export is identical to the in-memory one."""
+        from kwaras.formats.eaf import Eaf, stream_to_csv
+
+        eafile = Eaf(str(sample_eaf_file))
+        eafile.export_to_csv(str(tmp_path / "tree.csv"))
+        stream_to_csv(str(sample_eaf_file), str(tmp_path / "stream.csv"))
+
+        assert (tmp_path / "stream.csv").read_bytes() == (tmp_path / "tree.csv").read_bytes()
+
+
+class TestReadHeader:
+    """Tests for reading EAF headers."""
+
+    def test_read_header(self, sample_eaf_file):
+        """Test that media and id properties are read from the HEADER."""
+        from kwaras.formats.eaf import read_header
+
+        header = read_header(str(sample_eaf_file), chunk_size=64)
+
+        assert header == {
+            "MEDIA_URL": ["file:///corpus/wav/session1.wav"],
+            "RELATIVE_MEDIA_URL": ["../wav/session1.wav"],
+            "TIME_UNITS": "milliseconds",
+            "lastUsedAnnotationId": "8",
+        }
+
+
+class TestSnapshotCache:
+    """Tests for the on-disk cache of column copies."""
+
+    def test_status(self, sample_eaf_file):
+        """Test coverage of each tier relative to the speaker's baseline."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+
+        assert eafile.status() == {"Broad@A": 1.0, "English@A": 0.5, "Word@A": 0.5, "Gloss@A": 0.5}
+        assert eafile.columns().status(["Broad", "Word"]) == {"Broad@A": 1.0, "Word@A": 0.5}
+
+    def test_cached_columns_export_like_eaf(self, sample_eaf_file, tmp_path):
+        """Test that cached columns hold the same arrays and export identically."""
+        from kwaras.formats.eaf import Eaf, EafCache
+
+        cache = EafCache(str(tmp_path / "cache"))
+        eafile = Eaf(str(sample_eaf_file))
+        key = cache.key(str(sample_eaf_file))
+        assert cache.get(key) is None
+        columns = eafile.columns()
+        cache.put(key, columns)
+        cached = cache.get(key)
+        for name in ("tier_ids", "codes", "tier", "start", "end", "parent", "value", "values"):
+            assert getattr(cached, name) == getattr(columns, name)
+        assert cached.filename == eafile.filename
+        assert list(cached.export_segments(["Broad", "Word"])) == list(
+            eafile.export_segments(["Broad", "Word"])
+        )
+
+        cache.get(key).export_to_csv(str(tmp_path / "cached.csv"), fields=["English"])
+        eafile.export_to_csv(str(tmp_path / "tree.csv"), fields=["English"])
+
+        assert (tmp_path / "cached.csv").read_bytes() == (tmp_path / "tree.csv").read_bytes()
+
+    def test_times_keep_their_width(self, sample_eaf_file):
+        """Test that times are read back as 8-byte arrays, whether or not they fit in 4."""
+        from kwaras.formats.eaf import Eaf, EafColumns
+
+        columns = Eaf(str(sample_eaf_file)).columns()
+        short = EafColumns.loads(columns.dumps())
+        columns.end[0] = 2**40
+        long = EafColumns.loads(columns.dumps())
+
+        assert short.start == columns.start and short.start.typecode == "q"
+        assert long.end == columns.end and long.end.typecode == "q"
+        assert long.end[0] == 2**40
+
+    def test_key_changes_with_content(self, sample_eaf_file, tmp_path):
+        """Test that editing the source gives a new cache key."""
+        from kwaras.formats.eaf import EafCache
+
+        cache = EafCache(str(tmp_path / "cache"))
+        key = cache.key(str(sample_eaf_file))
+        sample_eaf_file.write_text(sample_eaf_file.read_text().replace("ma", "mu"))
+
+        assert cache.key(str(sample_eaf_file)) != key
+
+    def test_evicts_least_recently_used(self, sample_eaf_file, tmp_path):
+        """Test that the oldest entries are removed when over the size limit."""
+        import os
+
+        from kwaras.formats.eaf import Eaf, EafCache
+
+        columns = Eaf(str(sample_eaf_file)).columns()
+        cache = EafCache(str(tmp_path / "cache"))
+        for n, key in enumerate(["old", "mid", "new"]):
+            cache.put(key, columns)
+            os.utime(cache._path(key), ns=(n * 10**9, n * 10**9))
+        cache.get("old")
+        cache.max_bytes = 2 * len(columns.dumps())
+        cache.evict()
+
+        assert sorted(os.listdir(str(tmp_path / "cache"))) == ["new.snap", "old.snap"]
+
+
+def _old_coverage(fnames, rows):
+    """Compute coverage as Eaf.status did, looking up each baseline annotation in turn."""
+    coverage = {}
+    for spkr in set(f.partition("@")[2] for f in fnames):
+        fset = [f for f in fnames if f.partition("@")[2] == spkr]
+        basenotes = rows[fset[0]]
+        for f in fset:
+            count = 0
+            for start, stop, _value in basenotes:
+                if [n for n in rows[f] if start <= n[0] and n[1] <= stop and n[2].strip() != ""]:
+                    count += 1
+            coverage[f] = round(float(count) / len(basenotes), 2) if basenotes else 0
+    return coverage
+
+
+class TestCoverage:
+    """Tests for the sweep that status() uses, against the per-annotation lookup it replaced."""
+
+    def test_matches_per_annotation_lookup(self):
+        """Test overlaps, blank values, gaps, nesting and several speakers."""
+        from kwaras.formats.eaf import _coverage
+
+        rows = {
+            # baseline annotations out of order, overlapping, nested and with gaps between
+            "Broad@A": [(2000, 3000, "c"), (0, 1000, "a"), (500, 1500, "b"), (600, 700, "d")],
+            "English@A": [
+                (0, 1000, "x"),  # covers a, and not the b it overlaps
+                (550, 650, " "),  # blank, inside b and d
+                (2500, 3500, "y"),  # runs past c
+                (1600, 1900, "z"),  # in a gap
+            ],
+            "Note@A": [(600, 700, ""), (2000, 2000, "n"), (700, 1500, "m")],
+            "Broad@B": [(0, 500, "p"), (400, 900, "q")],
+            "English@B": [(400, 500, "r"), (450, 900, "s")],
+            "Broad@C": [],
+            "English@C": [(0, 100, "t")],
+        }
+        fnames = list(rows)
+
+        expected = _old_coverage(fnames, rows)
+        assert _coverage(fnames, rows) == expected
+        assert expected == {
+            "Broad@A": 1.0,
+            "English@A": 0.25,
+            "Note@A": 0.5,
+            "Broad@B": 1.0,
+            "English@B": 1.0,
+            "Broad@C": 0,
+            "English@C": 0,
+        }
+
+    def test_matches_per_annotation_lookup_on_random_tiers(self):
+        """Test random tiers, with many shared and touching boundaries."""
+        import random
+
+        from kwaras.formats.eaf import _coverage
+
+        rand = random.Random(0)
+
+        def tier(count):
+            notes = []
+            for _ in range(count):
+                start = rand.randrange(0, 50) * 10
+                stop = start + rand.randrange(0, 20) * 10
+                notes.append((start, stop, rand.choice(["", " ", "v", "w"])))
+            return notes
+
+        for _ in range(200):
+            rows = {}
+            for spkr in rand.sample("ABC", rand.randrange(1, 4)):
+                for field in ("Broad", "English", "Note")[: rand.randrange(1, 4)]:
+                    rows[field + "@" + spkr] = tier(rand.randrange(0, 12))
+            fnames = list(rows)
+            assert _coverage(fnames, rows) == _old_coverage(fnames, rows)
+
+
+class TestColumns:
+    """Tests for the column-oriented annotation store."""
+
+    def test_columns(self, sample_eaf_file):
+        """Test the columns hold tiers, times, parents and interned values."""
+        from kwaras.formats.eaf import Eaf
+
+        cols = Eaf(str(sample_eaf_file)).columns()
+
+        assert len(cols) == 8
+        assert list(cols.tier) == [0, 0, 1, 1, 2, 2, 3, 3]
+        assert list(cols.start) == [0, 1500, 0, 1500, 0, 0, 0, 0]
+        assert list(cols.parent) == [-1, -1, 0, 1, 0, 0, 4, 5]
+        assert cols.get_values(cols.tier_rows("Gloss@A")) == ["two", "word"]
+
+    def test_select(self, sample_eaf_file):
+        """Test range queries agree with Eaf.get_annotations_in."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        cols = eafile.columns()
+
+        for start, stop in [(0, 2500), (0, 1000), (500, 2500), (1000, 1400)]:
+            for tid in eafile.get_tier_ids():
+                values = cols.get_values(cols.select([tid], start, stop))
+                annots = eafile.get_annotations_in(tid, start, stop)
+                assert values == [a.findtext("ANNOTATION_VALUE").strip() for a in annots]
+        assert list(cols.select(["English@A", "Broad@A"], 1500)) == [1, 3]
+
+    def test_tier_subset_answers_queries(self, sample_eaf_file):
+        """Test that a copy of some tiers reports and exports them as the Eaf does."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        cols = eafile.columns(["Broad@A", "Word@A"])
+
+        assert list(cols.tier) == [0, 0, 2, 2]
+        assert list(cols.parent) == [-1, -1, 0, 0]
+        assert cols.status(["Broad", "Word"]) == eafile.status(["Broad", "Word"])
+        assert list(cols.export_rows(["Word"])) == [
+            ("Word@A", 0, 1000, "ba"),
+            ("Word@A", 0, 1000, "ka"),
+        ]
+        assert list(cols.export_segments(["Broad", "Word"])) == [
+            (0, 1000, "A", ["ba ka", "ka"]),
+            (1500, 2500, "A", ["ma", ""]),
+        ]
+
+
+class TestCsvExport:
+    """Tests for csv export sessions."""
+
+    def test_session_matches_export_to_csv(self, sample_eaf_file, tmp_path):
+        """Test that a session writes the same bytes as repeated appends."""
+        from kwaras.formats.eaf import CsvExport, Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        eafile.export_to_csv(str(tmp_path / "appended.csv"), fields=["Broad"])
+        eafile.export_to_csv(str(tmp_path / "appended.csv"), fields=["Gloss"], mode="a")
+        with CsvExport(str(tmp_path / "session.csv")) as export:
+            export.add(eafile, ["Broad"])
+            export.add(eafile.columns(), ["Gloss"])
+
+        assert (tmp_path / "session.csv").read_bytes() == (tmp_path / "appended.csv").read_bytes()
+
+    def test_gzip_session(self, sample_eaf_file, tmp_path):
+        """Test that a .gz destination is compressed."""
+        import csv
+        import gzip
+
+        from kwaras.formats.eaf import CsvExport
+
+        with CsvExport(str(tmp_path / "data.csv.gz")) as export:
+            export.write_rows([("Broad@A", 0, 1000, "ba, ka")], "s.eaf")
+
+        with gzip.open(str(tmp_path / "data.csv.gz"), "rt", encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        assert rows == [
+            ["fieldname", "start", "end", "value", "filename"],
+            ["Broad@A", "0", "1000", "ba, ka", "s.eaf"],
+        ]
+
+    def test_wide_export(self, sample_eaf_file, tmp_path):
+        """Test one row per segment, with a column per field, from an Eaf or its columns."""
+        import csv
+
+        from kwaras.formats.eaf import Eaf, SegmentExport
+
+        eafile = Eaf(str(sample_eaf_file))
+        fields = ["Broad", "English", "Word", "Note"]
+        with SegmentExport(str(tmp_path / "wide.csv"), fields) as export:
+            export.add(eafile)
+            export.add(eafile.columns())
+
+        with open(str(tmp_path / "wide.csv"), encoding="utf-8", newline="") as f:
+            rows = list(csv.reader(f))
+        source = str(sample_eaf_file)
+        segments = [
+            [source, "0", "1000", "A", "ba ka", "two words", "ka", ""],
+            [source, "1500", "2500", "A", "ma", "", "", ""],
+        ]
+        assert rows[0] == ["filename", "start", "end", "speaker"] + fields
+        assert rows[1:] == segments + segments
+
+        eafile.export_to_csv(str(tmp_path / "short.csv"), fields=fields, wide=True)
+        assert (tmp_path / "short.csv").read_text(encoding="utf-8").count("\n") == 3
+
+
+class TestWrite:
+    """Tests for writing EAFs."""
+
+    def test_write_round_trip(self, sample_eaf_file, tmp_path):
+        """Test that a written EAF reads back the same, leaving no temporary file."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file))
+        assert eafile.write(str(tmp_path / "auto.eaf")) is True
+
+        copy = Eaf(str(tmp_path / "auto.eaf"))
+        assert copy.get_tier_ids() == eafile.get_tier_ids()
+        assert copy.times == eafile.times
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["auto.eaf", "session1.eaf"]
+
+    def test_write_skip_unchanged(self, sample_eaf_file, tmp_path):
+        """Test that identical output leaves the target alone, and changes replace it."""
+        import os
+
+        from kwaras.formats.eaf import Eaf
+
+        target = tmp_path / "auto.eaf"
+        eafile = Eaf(str(sample_eaf_file))
+        eafile.write(str(target))
+        os.utime(str(target), ns=(0, 0))
+
+        assert eafile.write(str(target), skip_unchanged=True) is False
+        assert target.stat().st_mtime_ns == 0
+
+        eafile.get_annotation("a2").find("ANNOTATION_VALUE").text = "mu"
+        assert eafile.write(str(target), skip_unchanged=True) is True
+        assert "mu" in target.read_text(encoding="utf-8")
+
+    def test_write_patch_only_changes_values(self, sample_eaf_file, tmp_path):
+        """Test that patch mode rewrites only the edited annotation values."""
+        from kwaras.formats.eaf import Eaf
+
+        source = sample_eaf_file.read_bytes().replace(
+            b"<ANNOTATION_VALUE></ANNOTATION_VALUE>", b"<ANNOTATION_VALUE/>"
+        )
+        sample_eaf_file.write_bytes(source)
+        target = tmp_path / "patched.eaf"
+
+        eafile = Eaf(str(sample_eaf_file), patchable=True)
+        eafile.write(str(target), patch=True)
+        assert target.read_bytes() == source
+
+        eafile.get_annotation("a2").find("ANNOTATION_VALUE").text = "m<a>"
+        eafile.get_annotation("a4").find("ANNOTATION_VALUE").text = "ñ"
+        eafile.write(str(target), patch=True)
+        expected = source.replace(b">ma<", b">m&lt;a&gt;<").replace(
+            b"<ANNOTATION_VALUE/>", "<ANNOTATION_VALUE>ñ</ANNOTATION_VALUE>".encode()
+        )
+        assert target.read_bytes() == expected
+
+        copy = Eaf(str(target))
+        assert copy.get_annotation("a2").find("ANNOTATION_VALUE").text == "m<a>"
+        assert copy.get_annotation("a4").find("ANNOTATION_VALUE").text == "ñ"
+
+    def test_write_patch_falls_back_on_structural_edits(self, sample_eaf_file, tmp_path):
+        """Test that patch mode serializes in full when more than values changed."""
+        from kwaras.formats.eaf import Eaf
+
+        target = tmp_path / "patched.eaf"
+        eafile = Eaf(str(sample_eaf_file), patchable=True)
+        eafile.rename_tier(eafile.get_tier_by_id("Gloss@A"), "Glosses@A")
+        eafile.write(str(target), patch=True)
+
+        copy = Eaf(str(target))
+        assert "Glosses@A" in copy.get_tier_ids()
+        assert target.read_bytes() != sample_eaf_file.read_bytes()
+
+
+class TestLazy:
+    """Tests for parsing tiers on first use."""
+
+    def test_lazy_parses_only_looked_up_tiers(self, sample_eaf_file):
+        """Test that a lookup parses the tier and its parents, and nothing else."""
+        from kwaras.formats.eaf import Eaf
+
+        eafile = Eaf(str(sample_eaf_file), lazy=True)
+        assert eafile.get_tier_ids() == ["Broad@A", "English@A", "Word@A", "Gloss@A"]
+        assert all(len(t) == 0 for t in eafile.eafile.findall("TIER"))
+
+        rows = list(eafile.export_rows(["English"]))
+
+        assert rows == [("English@A", 0, 1000, "two words"), ("English@A", 1500, 2500, "")]
+        parsed = [t.get("TIER_ID") for t in eafile.eafile.findall("TIER") if len(t)]
+        assert parsed == ["Broad@A", "English@A"]
+
+    def test_lazy_matches_full_parse(self, sample_eaf_file, tmp_path):
+        """Test that a lazy Eaf looks up, exports and writes just as a fully parsed one."""
+        from kwaras.formats.eaf import Eaf
+
+        full = Eaf(str(sample_eaf_file))
+        lazy = Eaf(str(sample_eaf_file), lazy=True)
+
+        assert lazy.get_tier_of("a7").get("TIER_ID") == "Gloss@A"
+        assert lazy.get_time(lazy.get_annotation("a7")) == [0, 1000]
+        assert list(lazy.export_rows()) == list(full.export_rows())
+        assert lazy.status() == full.status()
+
+        full.write(str(tmp_path / "full.eaf"))
+        lazy.write(str(tmp_path / "lazy.eaf"))
+        assert (tmp_path / "lazy.eaf").read_bytes() == (tmp_path / "full.eaf").read_bytes()
+
+    def assert_lazy_matches_full(self, path, tmp_path):
+        """Check that a lazy Eaf of @path exports and writes just as a fully parsed one."""
+        from kwaras.formats.eaf import Eaf
+
+        full = Eaf(str(path))
+        lazy = Eaf(str(path), lazy=True)
+        assert lazy.get_tier_ids() == full.get_tier_ids()
+        assert list(lazy.export_rows()) == list(full.export_rows())
+        assert lazy.status() == full.status()
+
+        full.write(str(tmp_path / "full.eaf"))
+        lazy.write(str(tmp_path / "lazy.eaf"))
+        assert (tmp_path / "lazy.eaf").read_bytes() == (tmp_path / "full.eaf").read_bytes()
+
+    def test_lazy_handles_markup_that_looks_like_tiers(self, sample_eaf_file, tmp_path):
+        """Test comments, CDATA and ">" in attribute values around and inside tiers."""
+        sample = sample_eaf_file.read_text(encoding="utf-8")
+        edits = [
+            (
+                '<TIER LINGUISTIC_TYPE_REF="Free',
+                '<!-- <TIER x></TIER> --><TIER LINGUISTIC_TYPE_REF="Free',
+            ),
+            (">two words<", "><![CDATA[two </TIER> words]]><"),
+            ('TIER_ID="Word@A"', 'TIER_ID="Word@A" ANNOTATOR="a > b"'),
+        ]
+        for n, (old, new) in enumerate(edits):
+            path = tmp_path / f"sample{n}.eaf"
+            path.write_text(sample.replace(old, new, 1), encoding="utf-8")
+            self.assert_lazy_matches_full(path, tmp_path)
+
+    def test_lazy_reads_declared_encoding(self, sample_eaf_file, tmp_path):
+        """Test that tiers are parsed in the encoding the file declares."""
+        from kwaras.formats.eaf import Eaf
+
+        path = tmp_path / "latin1.eaf"
+        text = sample_eaf_file.read_text(encoding="utf-8").replace(
+            'encoding="UTF-8"', 'encoding="ISO-8859-1"'
+        )
+        path.write_bytes(text.replace(">two words<", ">deux mots é<").encode("latin-1"))
+
+        self.assert_lazy_matches_full(path, tmp_path)
+        rows = list(Eaf(str(path), lazy=True).export_rows(["English"]))
+        assert rows[0] == ("English@A", 0, 1000, "deux mots é")
+
+    def test_lazy_falls_back_when_a_tier_needs_the_document(self, sample_eaf_file, tmp_path):
+        """Test that a tier that cannot be parsed on its own is taken from a full parse."""
+        from kwaras.formats.eaf import Eaf
+
+        path = tmp_path / "prefixed.eaf"
+        text = (
+            sample_eaf_file.read_text(encoding="utf-8")
+            .replace('VERSION="3.0">', 'VERSION="3.0" xmlns:ext="urn:example">', 1)
+            .replace('ANNOTATION_ID="a5"', 'ANNOTATION_ID="a5" ext:checked="yes"')
+        )
+        path.write_text(text, encoding="utf-8")
+
+        lazy = Eaf(str(path), lazy=True)
+        assert lazy._unparsed
+        assert lazy.get_annotation("a5").get("{urn:example}checked") == "yes"
+        assert not lazy._unparsed
+        self.assert_lazy_matches_full(path, tmp_path)
@@ -0,0 +1,305 @@
+"""Tests for exporting a corpus to the web interface."""
+
+import json
+import os
+
+
+class TestExportElan:
+    """Tests for cleaning and exporting the corpus EAFs."""
+
+    def test_cache_ignores_template_annotations(self, corpus_cfg, tmp_path, monkeypatch):
+        """Test that editing annotations of the template EAF keeps the other files cached."""
+        from kwaras.langs import Other
+        from kwaras.process import web
+
+        cleaned = []
+        clean_eaf = Other.clean_eaf
+        monkeypatch.setattr(
+            Other, "clean_eaf", lambda f, t=None: cleaned.append(f) or clean_eaf(f, t)
+        )
+        corpus_cfg["EAF_CACHE"] = str(tmp_path / "cache")
+
+        web.export_elan(dict(corpus_cfg), ["Broad", "English"])
+        assert len(cleaned) == 3
+
+        template = tmp_path / "eafs" / "s1.eaf"
+        template.write_text(
+            template.read_text(encoding="utf-8").replace(">ma<", ">mo<"), encoding="utf-8"
+        )
+        del cleaned[:]
+        web.export_elan(dict(corpus_cfg), ["Broad", "English"])
+        assert cleaned == [str(template)]
+
+    def test_jobs_give_same_output(self, corpus_cfg, tmp_path):
+        """Test that cleaning in two processes writes the same files as in one."""
+        import shutil
+
+        from kwaras.process import web
+
+        def outputs():
+            auto = tmp_path / "eafs" / "auto"
+            files = {p.name: p.read_bytes() for p in auto.iterdir()}
+            for name in ("status.csv", "data.csv"):
+                files[name] = (tmp_path / "data" / name).read_bytes()
+            shutil.rmtree(str(auto))
+            return files
+
+        serial = web.export_elan(dict(corpus_cfg), ["Broad", "English"], jobs=1)
+        serial_files = outputs()
+        parallel = web.export_elan(dict(corpus_cfg), ["Broad", "English"], jobs=2)
+
+        assert parallel == serial
+        assert outputs() == serial_files
+        assert sorted(serial_files) == ["data.csv", "s1.eaf", "s2.eaf", "s3.eaf", "status.csv"]
+
+
+def _baseline_clip(wav_file, clip_file, start, stop):
+    """Cut a clip the way clip_wav did before WavSource, opening the WAV for each clip."""
+    import wave
+
+    with wave.open(wav_file, "rb") as win:
+        framerate = win.getframerate()
+        win.setpos(int((start / 1000.0) * framerate))
+        with wave.open(clip_file, "wb") as wout:
+            wout.setparams(win.getparams())
+            wout.writeframes(win.readframes(int(((stop - start) / 1000.0) * framerate)))
+
+
+class TestWavSource:
+    """Tests for cutting clips from one open WAV."""
+
+    def cut(self, wav, tmp_path, spans):
+        """Cut @spans with one WavSource and with the baseline, returning both sets of bytes."""
+        from kwaras.process import web
+
+        out = tmp_path / "out"
+        out.mkdir()
+        clips, expected = [], []
+        with web.WavSource(str(wav)) as source:
+            for i, (start, stop) in enumerate(spans):
+                assert source.clip(str(out / f"{i}.wav"), start, stop)
+                _baseline_clip(str(wav), str(out / f"{i}.base.wav"), start, stop)
+                clips.append((out / f"{i}.wav").read_bytes())
+                expected.append((out / f"{i}.base.wav").read_bytes())
+        return clips, expected
+
+    def test_overlapping_clips(self, corpus_cfg, tmp_path):
+        """Test that clips sharing frames match clips cut one by one."""
+        wav = tmp_path / "wav" / "session1.wav"
+        spans = [(0, 1000), (500, 1500), (600, 900), (1200, 2000), (100, 400)]
+        clips, expected = self.cut(wav, tmp_path, spans)
+        assert clips == expected
+        assert len(set(clips)) == len(spans)
+
+    def test_adjacent_clips(self, corpus_cfg, tmp_path):
+        """Test that clips starting where the last one stopped match clips cut one by one."""
+        wav = tmp_path / "wav" / "session1.wav"
+        spans = [(0, 1000), (1000, 1500), (1500, 2999), (2999, 3000)]
+        clips, expected = self.cut(wav, tmp_path, spans)
+        assert clips == expected
+
+    def test_reads_in_any_order(self, corpus_cfg, tmp_path):
+        """Test that reads behind, inside or past the last one still get the right frames."""
+        import random
+        import wave
+
+        from kwaras.process import web
+
+        wav = tmp_path / "wav" / "session1.wav"
+        with wave.open(str(wav), "rb") as win:
+            frames = win.readframes(win.getnframes())
+        rand = random.Random(0)
+        with web.WavSource(str(wav)) as source:
+            for _ in range(200):
+                start = rand.randrange(24000)
+                count = rand.randrange(4000)
+                assert source.read(start, count) == frames[2 * start : 2 * (start + count)]
+
+    def test_clip_past_end(self, corpus_cfg, tmp_path):
+        """Test that a clip running past the end is cut short, and one starting past it is skipped."""
+        from kwaras.process import web
+
+        wav = tmp_path / "wav" / "session1.wav"
+        clips, expected = self.cut(wav, tmp_path, [(2500, 4000)])
+        assert clips == expected
+
+        clip_file = tmp_path / "late.wav"
+        assert web.clip_wav(str(wav), str(clip_file), 3500, 4000) is False
+        assert not clip_file.exists()
+
+
+def _clip_metadata(www):
+    """Read clip_metadata.csv without its random Token column."""
+    import csv
+
+    with open(str(www / "clip_metadata.csv"), encoding="utf-8", newline="") as f:
+        return [{k: v for k, v in row.items() if k != "Token"} for row in csv.DictReader(f)]
+
+
+class TestIncremental:
+    """Tests for rebuilding the web export from the manifest of the last build."""
+
+    def build(self, cfg, monkeypatch):
+        """Run web.main, returning the EAFs it cleaned."""
+        from kwaras.langs import Other
+        from kwaras.process import web
+
+        cleaned = []
+        clean_eaf = Other.clean_eaf
+        with monkeypatch.context() as m:
+            m.setattr(Other, "clean_eaf", lambda f, t=None: cleaned.append(f) or clean_eaf(f, t))
+            web.main(dict(cfg))
+        return sorted(os.path.basename(f) for f in cleaned)
+
+    def test_unchanged_eafs_are_reused(self, corpus_cfg, tmp_path, monkeypatch):
+        """Test that a second build cleans and clips nothing, and writes the same output."""
+        www = tmp_path / "www"
+        assert self.build(corpus_cfg, monkeypatch) == ["s1.eaf", "s2.eaf", "s3.eaf"]
+        clips = {p.name: p.stat().st_mtime_ns for p in (www / "clips").iterdir()}
+        rows = _clip_metadata(www)
+        data = (tmp_path / "data" / "data.csv").read_bytes()
+
+        assert self.build(corpus_cfg, monkeypatch) == []
+        assert {p.name: p.stat().st_mtime_ns for p in (www / "clips").iterdir()} == clips
+        assert _clip_metadata(www) == rows
+        assert (tmp_path / "data" / "data.csv").read_bytes() == data
+        assert len(clips) == 4
+
+        # the manifest stays out of the published directory, and holds no annotations
+        assert not (www / "manifest.json").exists()
+        manifest = json.loads((tmp_path / "eafs" / "auto" / "manifest.json").read_text())
+        assert {k for entry in manifest["eafs"].values() for k in entry} == {"digest", "clips"}
+        assert "two words" not in json.dumps(manifest)
+
+    def test_edited_eaf_is_exported_again(self, corpus_cfg, tmp_path, monkeypatch):
+        """Test that only an edited EAF is cleaned again, giving the output of a full build."""
+        www = tmp_path / "www"
+        self.build(corpus_cfg, monkeypatch)
+        eaf_file = tmp_path / "eafs" / "s2.eaf"
+        eaf_file.write_text(eaf_file.read_text().replace("two words", "two birds"))
+
+        assert self.build(corpus_cfg, monkeypatch) == ["s2.eaf"]
+        rows = _clip_metadata(www)
+        assert "two birds" in [row["English"] for row in rows]
+        data = (tmp_path / "data" / "data.csv").read_bytes()
+
+        (tmp_path / "eafs" / "auto" / "manifest.json").unlink()
+        assert self.build(corpus_cfg, monkeypatch) == ["s1.eaf", "s2.eaf", "s3.eaf"]
+        assert _clip_metadata(www) == rows
+        assert (tmp_path / "data" / "data.csv").read_bytes() == data
+
+    def test_deleted_eaf_output_is_removed(self, corpus_cfg, tmp_path, monkeypatch):
+        """Test that the cleaned copy and the clips of a deleted EAF are removed."""
+        www = tmp_path / "www"
+        self.build(corpus_cfg, monkeypatch)
+        clips = sorted(p.name for p in (www / "clips").iterdir())
+        assert [c for c in clips if c.startswith("session2")]
+
+        (tmp_path / "eafs" / "s2.eaf").unlink()
+        assert self.build(corpus_cfg, monkeypatch) == []
+
+        assert not (tmp_path / "eafs" / "auto" / "s2.eaf").exists()
+        kept = [c for c in clips if c.startswith("session1")]
+        assert sorted(p.name for p in (www / "clips").iterdir()) == kept
+        assert {row["EAF"] for row in _clip_metadata(www)} == {"s1.eaf"}
+
+    def test_changed_fields_rebuild_everything(self, corpus_cfg, monkeypatch):
+        """Test that changing the export fields cleans every EAF again."""
+        self.build(corpus_cfg, monkeypatch)
+        corpus_cfg["EXP_FIELDS"] = "Broad, English, Gloss"
+
+        assert self.build(corpus_cfg, monkeypatch) == ["s1.eaf", "s2.eaf", "s3.eaf"]
+
+    def test_changed_wav_is_clipped_again(self, corpus_cfg, tmp_path, monkeypatch):
+        """Test that clips of an unchanged EAF are cut again when its WAV changes size or time."""
+        import random
+        import wave
+
+        www = tmp_path / "www"
+        wav = tmp_path / "wav" / "session1.wav"
+        clip_file = www / "clips" / "session1[00_000-00_010].wav"
+        rand = random.Random(1)
+        for seconds, mtime in [(3, None), (4, wav.stat().st_mtime_ns)]:
+            self.build(corpus_cfg, monkeypatch)
+            with wave.open(str(wav), "wb") as w:
+                w.setnchannels(1)
+                w.setsampwidth(2)
+                w.setframerate(8000)
+                w.writeframes(bytes(rand.randrange(256) for _ in range(2 * 8000 * seconds)))
+            if mtime is None:
+                os.utime(str(wav), ns=(0, 0))  # same size, new time
+            else:
+                os.utime(str(wav), ns=(mtime, mtime))  # new size, same time
+
+            assert self.build(corpus_cfg, monkeypatch) == []
+            _baseline_clip(str(wav), str(tmp_path / "expected.wav"), 0, 1000)
+            assert clip_file.read_bytes() == (tmp_path / "expected.wav").read_bytes()
+
+    def test_failed_clip_keeps_last_good_clip(self, corpus_cfg, tmp_path, monkeypatch):
+        """Test that clips of an unchanged EAF survive a build where they cannot be cut."""
+        from kwaras.process import web
+
+        www = tmp_path / "www"
+        self.build(corpus_cfg, monkeypatch)
+        clips = sorted(p.name for p in (www / "clips").iterdir())
+        wav = tmp_path / "wav" / "session1.wav"
+        os.utime(str(wav), ns=(0, 0))  # the clips of session1 are cut again
+
+        def fail(*args):
+            raise OSError("disk full")
+
+        with monkeypatch.context() as m:
+            m.setattr(web.WavSource, "write", fail)
+            self.build(corpus_cfg, monkeypatch)
+        assert sorted(p.name for p in (www / "clips").iterdir()) == clips
+        assert {row["EAF"] for row in _clip_metadata(www)} == {"s2.eaf"}
+
+        self.build(corpus_cfg, monkeypatch)
+        assert sorted(p.name for p in (www / "clips").iterdir()) == clips
+        assert {row["EAF"] for row in _clip_metadata(www)} == {"s1.eaf", "s2.eaf"}
+
+
+class TestClipThreads:
+    """Tests for writing clips from several threads."""
+
+    def test_threads_give_same_output(self, corpus_cfg, tmp_path, monkeypatch):
+        """Test that rows, clip metadata and clips match with one thread and with four."""
+        import random
+        import shutil
+
+        from kwaras.process import web
+
+        www = tmp_path / "www"
+        write = web.WavSource.write
+        tried = set()
+
+        def flaky(source, clip_file, data):
+            # the first write of each clip fails, so the next EAF with the segment makes it
+            if clip_file not in tried:
+                tried.add(clip_file)
+                raise OSError("disk full")
+            return write(source, clip_file, data)
+
+        monkeypatch.setattr(web.WavSource, "write", flaky)
+        outputs = []
+        for threads in (1, 4):
+            random.seed(0)  # for the same row tokens
+            tried.clear()
+            web.main(dict(corpus_cfg, CLIP_THREADS=threads))
+            files = {p.name: p.read_bytes() for p in (www / "clips").iterdir()}
+            for name in ("index.html", "clip_metadata.csv"):
+                files[name] = (www / name).read_bytes()
+            outputs.append(files)
+            eafs = {row["EAF"] for row in _clip_metadata(www)}
+            shutil.rmtree(str(www / "clips"))
+            (tmp_path / "eafs" / "auto" / "manifest.json").unlink()
+
+        assert outputs[0] == outputs[1]
+        # s2 has no second try at its segments; s3 makes the clips s1 failed to
+        assert sorted(outputs[0]) == [
+            "clip_metadata.csv",
+            "index.html",
+            "session1[00_000-00_010].wav",
+            "session1[00_015-00_025].wav",
+        ]
+        assert eafs == {"s3.eaf"}